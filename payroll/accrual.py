@@ -0,0 +1,113 @@
+"""
+Monthly salary accrual.
+
+A pay run credits every active employee with the salary earned in the period: the full
+`salary_rate` for employees hired before the period started, and a pro-rated share for
+employees hired during it. The amounts are computed by the database and appended to the
+ledger with a handful of set-based INSERT ... SELECTs (one for full-period employees, one
+per distinct hire date inside the period), never by looping over Employee objects.
+"""
+import calendar
+from dataclasses import dataclass
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Sum, Value
+from django.db.models.functions import Round
+
+from . import ledger
+from .models import Employee, LedgerEntry, PayrollRun
+
+
+@dataclass
+class AccrualResult:
+    run: PayrollRun
+    created: bool
+
+
+def month_bounds(year, month):
+    """
+    First and last day of the month.
+    """
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def previous_month(today=None):
+    today = today or date.today()
+    last_day = today.replace(day=1) - timedelta(days=1)
+    return last_day.year, last_day.month
+
+
+def accrual_groups(period_start, period_end):
+    """
+    (queryset, factor) pairs covering every employee owed salary for the period.
+
+    Employees in one group earn the same fraction of their `salary_rate`: 1 for those
+    hired on or before the first day, (days employed / days in period) for later hires.
+    """
+    active = Employee.objects.filter(is_active=True)
+    groups = [(active.filter(hire_date__lte=period_start), Decimal(1))]
+
+    days_in_period = (period_end - period_start).days + 1
+    hire_dates = (
+        active.filter(hire_date__gt=period_start, hire_date__lte=period_end)
+        .order_by('hire_date')
+        .values_list('hire_date', flat=True)
+        .distinct()
+    )
+    for hire_date in hire_dates:
+        factor = Decimal((period_end - hire_date).days + 1) / Decimal(days_in_period)
+        groups.append((active.filter(hire_date=hire_date), factor))
+    return groups
+
+
+def _credit(factor):
+    """
+    The amount an employee in a group earns, rounded to cents.
+    """
+    if factor == 1:
+        return F('salary_rate')
+    return Round(
+        F('salary_rate') * Value(factor, output_field=DecimalField(max_digits=12, decimal_places=10)),
+        2,
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+def run_accrual(year, month, dry_run=False):
+    """
+    Credit the salary for one month to all active employees.
+
+    Safe to re-run: the PayrollRun row for the period is created in the same transaction
+    as the credits, so a period that was already paid is returned untouched with
+    `created=False`. With `dry_run` the totals are computed and nothing is written.
+    """
+    period_start, period_end = month_bounds(year, month)
+
+    with transaction.atomic():
+        run, created = PayrollRun.objects.select_for_update().get_or_create(
+            period_start=period_start, defaults={'period_end': period_end},
+        )
+        if not created:
+            return AccrualResult(run, created=False)
+
+        employees_credited = 0
+        total_credited = Decimal(0)
+        for queryset, factor in accrual_groups(period_start, period_end):
+            totals = queryset.aggregate(count=Count('pk'), total=Sum(_credit(factor)))
+            if not totals['count']:
+                continue
+            employees_credited += totals['count']
+            total_credited += Decimal(totals['total']).quantize(Decimal('0.01'))
+            if not dry_run:
+                ledger.post_for_queryset(queryset, LedgerEntry.ACCRUAL, _credit(factor), payroll_run_id=run.pk)
+
+        run.employees_credited = employees_credited
+        run.total_credited = total_credited
+        if dry_run:
+            transaction.set_rollback(True)
+        else:
+            run.save(update_fields=['employees_credited', 'total_credited'])
+
+    return AccrualResult(run, created=True)
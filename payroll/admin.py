@@ -1,4 +1,5 @@
 from django.contrib import admin
+from . import search
 from .models import Employee
 
 @admin.register(Employee)
@@ -11,10 +12,17 @@ class EmployeeAdmin(admin.ModelAdmin):
         'salary_rate', 'hire_date', 'is_active'
     )  # Columns displayed in the list view
     list_filter = ('is_active', 'position')  # Filters for the sidebar
-    search_fields = ('first_name', 'last_name', 'position')  # Searchable fields
+    search_fields = ('first_name', 'last_name', 'employee_code')  # Matched through payroll.search, see below
     ordering = ('last_name',)  # Default ordering by last name
     actions = ['delete_selected_employees']  # Custom action for batch deletion
 
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Name prefix or employee code search on the indexed search keys, instead of
+        `icontains` table scans. Positions are filtered with the sidebar.
+        """
+        return search.search(queryset, search_term), False
+
     def get_actions(self, request):
         """
         Include default and custom actions dynamically.
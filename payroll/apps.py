@@ -1,7 +1,19 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class PayrollConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'payroll'
 
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from payroll_system.db import apply_sqlite_pragmas
+        from . import signals  # noqa: F401
+
+        connection_created.connect(apply_sqlite_pragmas)
+
+        if settings.PAYROLL_PROFILING:
+            # Before any connection exists, so every connection records queries for the profiler
+            from .profiling import install_query_recorder
+            connection_created.connect(install_query_recorder)
@@ -0,0 +1,84 @@
+"""
+Archive of processed payout requests.
+
+Processed requests never change again, yet left in PayoutRequest they would make every
+index the pending queue uses grow without end. `archive_processed` moves the ones
+processed more than PAYROLL_ARCHIVE_AFTER_DAYS ago to ArchivedPayoutRequest, one bounded
+batch per transaction (copy, then delete), so the hot table only holds pending and
+recently processed requests however many years of history are kept.
+
+Archived rows keep their id. Ids are never reused (SQLite AUTOINCREMENT, PostgreSQL
+sequences), so a request has the same id in either table and readers can treat the two
+as one store: `history` gives both querysets and `merge` interleaves their rows.
+"""
+import heapq
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedPayoutRequest, PayoutRequest
+
+ARCHIVED_FIELDS = ('id', 'employee_id', 'amount', 'requested_at', 'processed_at')
+
+
+def archive_horizon():
+    return timedelta(days=settings.PAYROLL_ARCHIVE_AFTER_DAYS)
+
+
+def archive_batch(cutoff, batch_size=1000):
+    """
+    Move up to `batch_size` requests processed before `cutoff`, oldest first, in one
+    transaction; returns how many were moved.
+    """
+    with transaction.atomic():
+        rows = list(
+            PayoutRequest.objects.filter(status='Processed', processed_at__lt=cutoff)
+            .order_by('processed_at', 'pk')
+            .values_list(*ARCHIVED_FIELDS)[:batch_size]
+        )
+        if not rows:
+            return 0
+        ArchivedPayoutRequest.objects.bulk_create(
+            [ArchivedPayoutRequest(**dict(zip(ARCHIVED_FIELDS, row))) for row in rows], batch_size=batch_size,
+        )
+        # Also deletes the requests' idempotency keys, long expired by now
+        PayoutRequest.objects.filter(pk__in=[row[0] for row in rows]).delete()
+    return len(rows)
+
+
+def archive_processed(older_than=None, batch_size=1000, max_batches=None):
+    """
+    Archive requests processed more than `older_than` ago (default: the archive horizon);
+    returns how many were moved. Stops after `max_batches` batches when given.
+    """
+    cutoff = timezone.now() - (archive_horizon() if older_than is None else older_than)
+    archived = batches = 0
+    while max_batches is None or batches < max_batches:
+        moved = archive_batch(cutoff, batch_size)
+        archived += moved
+        batches += 1
+        if moved < batch_size:
+            break
+    return archived
+
+
+def history(employee_id=None):
+    """
+    Querysets of processed payout requests in PayoutRequest and in the archive,
+    optionally of one employee.
+    """
+    live = PayoutRequest.objects.filter(status='Processed')
+    archived = ArchivedPayoutRequest.objects.all()
+    if employee_id is not None:
+        live = live.filter(employee_id=employee_id)
+        archived = archived.filter(employee_id=employee_id)
+    return live, archived
+
+
+def merge(*sorted_rows, key, reverse=False):
+    """
+    Lazily interleave row iterables that are each sorted by `key` into one sorted stream.
+    """
+    return heapq.merge(*sorted_rows, key=key, reverse=reverse)
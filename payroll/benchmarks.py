@@ -0,0 +1,352 @@
+"""
+Measurements of the payroll hot paths, used by the `benchmark` management command.
+
+Every benchmark returns a plain dict so results can be dumped as JSON and compared
+between runs.
+"""
+import random
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from decimal import Decimal
+
+from django.db import DatabaseError, OperationalError, close_old_connections, connection, reset_queries
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import ledger
+from .codes import assign_codes
+from .models import CustomUser, Employee, LedgerEntry, PayoutRequest
+from .payouts import create_pending, process_payout_requests
+from .roles import ACCOUNTANT_GROUP
+
+
+def summarize(durations):
+    """
+    Latency statistics in milliseconds.
+    """
+    if not durations:
+        return {'count': 0}
+    ordered = sorted(durations)
+    return {
+        'count': len(ordered),
+        'mean_ms': statistics.fmean(ordered) * 1000,
+        'min_ms': ordered[0] * 1000,
+        'median_ms': statistics.median(ordered) * 1000,
+        'p95_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        'max_ms': ordered[-1] * 1000,
+    }
+
+
+def throughput(count, elapsed):
+    """
+    Rate of `count` successful operations; failed ones are reported next to it, never in it.
+    """
+    return {'operations': count, 'seconds': elapsed, 'ops_per_second': count / elapsed if elapsed else None}
+
+
+def benchmark_users():
+    """
+    An accountant and a plain employee with a linked user, for the view benchmarks.
+    """
+    accountant = CustomUser.objects.filter(groups__name=ACCOUNTANT_GROUP).first()
+    employee_user = CustomUser.objects.filter(employee__isnull=False).exclude(groups__name=ACCOUNTANT_GROUP).first()
+    return accountant, employee_user
+
+
+def bench_view(url, user, iterations, warmup=2):
+    """
+    Latency of GET `url` as `user`, plus the number of queries a single request runs.
+    """
+    client = Client()
+    if user is not None:
+        client.force_login(user)
+
+    for _ in range(warmup):
+        client.get(url)
+
+    # A full query log would stop growing and hide the queries of this request
+    reset_queries()
+    with CaptureQueriesContext(connection) as captured:
+        status = client.get(url).status_code
+
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        client.get(url)
+        durations.append(time.perf_counter() - start)
+
+    return {'url': url, 'status': status, 'queries': len(captured), **summarize(durations)}
+
+
+def bench_views(iterations):
+    accountant, employee_user = benchmark_users()
+    cases = {
+        'profile': (reverse('profile'), employee_user),
+        'employee_list': (reverse('employee_list'), accountant),
+        'payout_request_list': (reverse('payout_request_list'), accountant),
+        'payout_request_list_by_amount': (f"{reverse('payout_request_list')}?sort_by=amount&order=desc", accountant),
+        'payout_history_accountant': (reverse('payout_history_list'), accountant),
+        'payout_history_employee': (reverse('payout_history_list'), employee_user),
+    }
+    return {
+        name: bench_view(url, user, iterations)
+        for name, (url, user) in cases.items()
+        if user is not None
+    }
+
+
+def _process(pk):
+    try:
+        PayoutRequest.objects.get(pk=pk).process_request()
+    except (ValueError, DatabaseError):
+        return False
+    return True
+
+
+def bench_process_request(request_ids, workers=1):
+    """
+    process_request() throughput over `request_ids`, optionally from several threads.
+    """
+    start = time.perf_counter()
+    outcomes = run_in_threads(_process, request_ids, workers)
+    elapsed = time.perf_counter() - start
+    return {
+        'workers': workers,
+        'succeeded': sum(outcomes),
+        'failed': len(outcomes) - sum(outcomes),
+        **throughput(sum(outcomes), elapsed),
+    }
+
+
+def bench_batch_processing(request_ids, chunk_size=1000):
+    start = time.perf_counter()
+    result = process_payout_requests(request_ids, chunk_size=chunk_size)
+    elapsed = time.perf_counter() - start
+    return {
+        'chunk_size': chunk_size,
+        'succeeded': len(result.processed),
+        'failed': len(result.failed),
+        **throughput(len(result.processed), elapsed),
+    }
+
+
+def take_pending(count):
+    return list(
+        PayoutRequest.objects.filter(status='Pending').order_by('pk').values_list('pk', flat=True)[:count]
+    )
+
+
+def run_in_threads(func, items, workers):
+    """
+    Map `func` over `items`, in the calling thread or in `workers` threads.
+    Each worker thread closes its own database connection when it runs out of work.
+    """
+    if workers == 1:
+        return [func(item) for item in items]
+
+    results = [None] * len(items)
+    indexes = iter(range(len(items)))
+    lock = threading.Lock()
+
+    def worker():
+        try:
+            while True:
+                with lock:
+                    index = next(indexes, None)
+                if index is None:
+                    return
+                results[index] = func(items[index])
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def bench_database_concurrency(workers, operations, employees=20):
+    """
+    Payout traffic from `workers` threads against the configured database: each
+    operation submits a payout request (a transaction that reads the balance, then
+    writes), processes the oldest pending one, or reads a balance, and is wrapped in
+    the connection handling of a web request, so CONN_MAX_AGE and pooling count.
+    """
+    staff = _bench_employees(employees)
+    LedgerEntry.objects.bulk_create(
+        LedgerEntry(employee=employee, kind=LedgerEntry.ADJUSTMENT, amount=Decimal(10 ** 6)) for employee in staff
+    )
+    rng = random.Random(0)
+    plan = [(rng.choice(('submit', 'submit', 'process', 'read')), rng.choice(staff)) for _ in range(operations)]
+    outcomes = Counter()
+    durations = []
+    lock = threading.Lock()
+
+    def run(step):
+        kind, employee = step
+        close_old_connections()
+        start = time.perf_counter()
+        try:
+            if kind == 'submit':
+                create_pending(employee, Decimal('1.00'))
+            elif kind == 'process':
+                request = PayoutRequest.objects.filter(status='Pending', employee=employee).order_by('pk').first()
+                if request is not None:
+                    request.process_request()
+            else:
+                ledger.balance(employee.pk)
+            outcome = 'ok'
+        except ValueError:
+            outcome = 'ok'  # Already processed by another thread: a business outcome, not a database failure
+        except OperationalError as error:
+            outcome = 'locked' if 'locked' in str(error) else 'error'
+        except DatabaseError:
+            outcome = 'error'
+        finally:
+            close_old_connections()
+        elapsed = time.perf_counter() - start
+        with lock:
+            outcomes[outcome] += 1
+            if outcome == 'ok':
+                durations.append(elapsed)
+
+    start = time.perf_counter()
+    run_in_threads(run, plan, workers)
+    elapsed = time.perf_counter() - start
+    return {
+        'workers': workers,
+        'succeeded': outcomes['ok'],
+        'database_locked': outcomes['locked'],
+        'other_errors': outcomes['error'],
+        'latency': summarize(durations),
+        **throughput(operations, elapsed),
+    }
+
+
+def _bench_employees(count):
+    # Every fourth one is an accountant, so the group assignment is measured too
+    return Employee.objects.bulk_create(assign_codes([
+        Employee(first_name='Bench', last_name=f'User{n}', position='Accountant' if n % 4 == 0 else 'Designer',
+                 salary_rate=1000, hire_date='2020-01-01')
+        for n in range(count)
+    ]))
+
+
+def _signup(username, employee_code, password):
+    return Client(raise_request_exception=False).post(reverse('register'), {
+        'username': username,
+        'employee_code': employee_code,
+        'password': password,
+        'confirm_password': password,
+    }).status_code
+
+
+def bench_registration(count, workers=1, password='Benchmark-Pass-123'):
+    """
+    Registration throughput through the real registration view, one new employee per signup.
+    Single-threaded runs also report the queries per signup (including the login).
+    """
+    employees = _bench_employees(count)
+
+    def register(employee):
+        return _signup(f'bench_{employee.employee_code}', employee.employee_code, password)
+
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        statuses = run_in_threads(register, employees, workers)
+        elapsed = time.perf_counter() - start
+
+    result = {
+        'workers': workers,
+        'succeeded': statuses.count(302),
+        'failed': len(statuses) - statuses.count(302),
+        **throughput(statuses.count(302), elapsed),
+    }
+    if workers == 1 and count:
+        result['queries_per_signup'] = len(queries) / count
+    return result
+
+
+def bench_registration_race(count, workers=2, password='Benchmark-Pass-123'):
+    """
+    Two signups with different usernames race for each of `count` employee codes.
+    Exactly one of each pair must register; the other must get the form back (200).
+    """
+    employees = _bench_employees(count)
+    attempts = [(employee, racer) for employee in employees for racer in ('a', 'b')]
+
+    def register(attempt):
+        employee, racer = attempt
+        return _signup(f'race_{racer}_{employee.employee_code}', employee.employee_code, password)
+
+    start = time.perf_counter()
+    statuses = run_in_threads(register, attempts, workers)
+    elapsed = time.perf_counter() - start
+
+    users_per_employee = Counter(
+        CustomUser.objects.filter(employee__in=employees).values_list('employee_id', flat=True)
+    )
+    return {
+        'workers': workers,
+        'registered': statuses.count(302),
+        'rejected': statuses.count(200),
+        'errors': len(statuses) - statuses.count(302) - statuses.count(200),
+        'employees_with_one_user': sum(1 for employee in employees if users_per_employee[employee.pk] == 1),
+        # A rejected signup is the expected answer for the losing racer, not a failure
+        **throughput(statuses.count(302) + statuses.count(200), elapsed),
+    }
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """
+    Report redirects (e.g. to the login page) as failures instead of following them.
+    """
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+_opener = urllib.request.build_opener(_NoRedirect)
+
+
+def _timed_get(url, headers):
+    start = time.perf_counter()
+    try:
+        with _opener.open(urllib.request.Request(url, headers=headers), timeout=30) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as error:
+        status = error.code
+    except OSError:
+        status = None
+    return status, time.perf_counter() - start
+
+
+def http_load(base_url, paths, cookie, requests, concurrency):
+    """
+    Throughput and latency of `requests` GETs per path against a running server,
+    issued from `concurrency` threads with the given session cookie header.
+    """
+    headers = {'Cookie': cookie}
+    results = {}
+    for path in paths:
+        url = base_url + path
+        start = time.perf_counter()
+        outcomes = run_in_threads(lambda _: _timed_get(url, headers), range(requests), concurrency)
+        elapsed = time.perf_counter() - start
+        statuses = [status for status, _ in outcomes]
+        results[path] = {
+            'concurrency': concurrency,
+            'ok': statuses.count(200),
+            'errors': len(statuses) - statuses.count(200),
+            **throughput(len(outcomes), elapsed),
+            **summarize([duration for _, duration in outcomes]),
+        }
+    return results
@@ -0,0 +1,133 @@
+"""
+Employee code generation.
+
+Codes come from a generator class named by `settings.PAYROLL_EMPLOYEE_CODE_GENERATOR`.
+The default, `SequenceCodeGenerator`, numbers employees from a database counter
+(CodeSequence) and appends a Luhn check digit, e.g. `P000001234` + check digit. A
+whole block of numbers is reserved with one UPDATE, so bulk imports get their codes
+without a per-row uniqueness check and two processes can never be handed the same
+number. `RandomCodeGenerator` keeps the old random hex codes; old hex codes never
+contain a `P`, so both kinds can live side by side (see `reissue_employee_codes`).
+"""
+import re
+import uuid
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils.module_loading import import_string
+
+from .models import CodeSequence, Employee
+
+DEFAULT_GENERATOR = 'payroll.codes.SequenceCodeGenerator'
+
+
+def allocate(count, name='employee_code'):
+    """
+    Reserve `count` consecutive numbers from the named sequence; returns the first one.
+    """
+    if count < 1:
+        raise ValueError("count must be positive.")
+    # No savepoint of its own: inside a caller's transaction the block is just part of it
+    with transaction.atomic(savepoint=False):
+        # Write first: the UPDATE takes the row (or SQLite database) lock before the read
+        if not CodeSequence.objects.filter(name=name).update(next_value=F('next_value') + count):
+            CodeSequence.objects.get_or_create(name=name)
+            CodeSequence.objects.filter(name=name).update(next_value=F('next_value') + count)
+        next_value = CodeSequence.objects.filter(name=name).values_list('next_value', flat=True).get()
+    return next_value - count
+
+
+def luhn_digit(digits):
+    """
+    The Luhn check digit for a string of digits.
+    """
+    total = 0
+    for position, digit in enumerate(reversed(digits)):
+        value = int(digit)
+        if position % 2 == 0:
+            value *= 2
+            if value > 9:
+                value -= 9
+        total += value
+    return str((10 - total % 10) % 10)
+
+
+class SequenceCodeGenerator:
+    prefix = 'P'
+    digits = 8
+    sequence = 'employee_code'
+    pattern = re.compile(r'^P(\d{8})(\d)$')
+
+    def format(self, number):
+        if not 0 < number < 10 ** self.digits:
+            raise ValueError(f"Employee code sequence exhausted at {number}.")
+        body = str(number).zfill(self.digits)
+        return f'{self.prefix}{body}{luhn_digit(body)}'
+
+    def is_valid(self, code):
+        match = self.pattern.match(code or '')
+        return bool(match) and luhn_digit(match.group(1)) == match.group(2)
+
+    def generate(self, count):
+        first = allocate(count, self.sequence)
+        return [self.format(number) for number in range(first, first + count)]
+
+
+class RandomCodeGenerator:
+    """
+    The original random 10-character hex codes, checked against the table once per batch.
+    """
+
+    def is_valid(self, code):
+        return bool(re.match(r'^[0-9a-f]{10}$', code or ''))
+
+    def generate(self, count):
+        codes = set()
+        while len(codes) < count:
+            candidates = {uuid.uuid4().hex[:10] for _ in range(count - len(codes))} - codes
+            taken = set(Employee.objects.filter(employee_code__in=candidates).values_list('employee_code', flat=True))
+            codes |= candidates - taken
+        return list(codes)
+
+
+def get_generator():
+    path = getattr(settings, 'PAYROLL_EMPLOYEE_CODE_GENERATOR', DEFAULT_GENERATOR)
+    return import_string(path)()
+
+
+def assign_codes(employees):
+    """
+    Give every employee without a code a fresh one, from a single block allocation.
+    """
+    pending = [employee for employee in employees if not employee.employee_code]
+    if pending:
+        for employee, code in zip(pending, get_generator().generate(len(pending))):
+            employee.employee_code = code
+    return employees
+
+
+def reissue_codes(include_unregistered=False, batch_size=1000, dry_run=False):
+    """
+    Replace codes the configured generator does not recognise with fresh ones.
+
+    Only employees who already registered are converted by default: their code is no
+    longer needed, while an unregistered employee may still be holding the old one to
+    sign up with. Returns the number of employees (that would be) updated.
+    """
+    generator = get_generator()
+    employees = Employee.objects.order_by('pk')
+    if not include_unregistered:
+        employees = employees.filter(user__isnull=False)
+    stale = [
+        pk for pk, code in employees.values_list('pk', 'employee_code').iterator(chunk_size=batch_size)
+        if not generator.is_valid(code)
+    ]
+    if dry_run:
+        return len(stale)
+
+    for start in range(0, len(stale), batch_size):
+        batch = [Employee(pk=pk, employee_code='') for pk in stale[start:start + batch_size]]
+        with transaction.atomic():
+            Employee.objects.bulk_update(assign_codes(batch), ['employee_code'])
+    return len(stale)
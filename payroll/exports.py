@@ -0,0 +1,92 @@
+"""
+Streaming exports of processed payouts.
+
+Rows are read through a server-side cursor (`.iterator(chunk_size=...)`) and encoded one
+line at a time, so memory stays flat however many rows are exported and the header line
+is produced before the query even runs. Live and archived payouts are read with one
+cursor each and merged in processed order (see payroll.archive).
+"""
+import csv
+import json
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from . import archive
+
+COLUMNS = (
+    ('id', 'pk'),
+    ('employee_id', 'employee_id'),
+    ('employee_code', 'employee__employee_code'),
+    ('first_name', 'employee__first_name'),
+    ('last_name', 'employee__last_name'),
+    ('amount', 'amount'),
+    ('requested_at', 'requested_at'),
+    ('processed_at', 'processed_at'),
+)
+HEADER = [name for name, _ in COLUMNS]
+PROCESSED_AT = HEADER.index('processed_at')
+FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def processed_payouts(start=None, end=None, employee_id=None):
+    """
+    Processed payouts as value tuples in COLUMNS order, oldest first: one queryset
+    for live requests and one for archived ones. `start` and `end` are dates; both
+    are inclusive.
+    """
+    querysets = []
+    for queryset in archive.history(employee_id):
+        if start is not None:
+            queryset = queryset.filter(processed_at__gte=_start_of_day(start))
+        if end is not None:
+            queryset = queryset.filter(processed_at__lt=_start_of_day(end + timedelta(days=1)))
+        querysets.append(queryset.order_by('processed_at', 'pk').values_list(*[lookup for _, lookup in COLUMNS]))
+    return querysets
+
+
+def _serialize(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+class _Echo:
+    """
+    File-like object whose write() hands the line back to the caller, for csv.writer.
+    """
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(HEADER)
+    for row in rows:
+        yield writer.writerow([_serialize(value) for value in row])
+
+
+def jsonl_lines(rows):
+    for row in rows:
+        yield json.dumps({name: _serialize(value) for name, value in zip(HEADER, row)}, default=str) + '\n'
+
+
+def export_lines(querysets, export_format, chunk_size=2000):
+    """
+    Lazily encode the rows of `querysets` (from processed_payouts) in the given format.
+    """
+    rows = archive.merge(
+        *(queryset.iterator(chunk_size=chunk_size) for queryset in querysets),
+        key=lambda row: (row[PROCESSED_AT], row[0]),
+    )
+    if export_format == 'csv':
+        return csv_lines(rows)
+    if export_format == 'jsonl':
+        return jsonl_lines(rows)
+    raise ValueError(f"Unsupported export format: {export_format}")
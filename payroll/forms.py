@@ -1,11 +1,20 @@
+import uuid
+
 from django import forms
+from django.db import transaction
+from django.db.models import Exists, OuterRef
 from .models import Employee, CustomUser, PayoutRequest
-from django.contrib.auth.models import Group
+from .roles import accountant_group_id
 
 class PayoutRequestForm(forms.ModelForm):
     """
     Form to handle payout requests by employees.
     """
+    # Fresh for every rendered form, so resubmitting the same form is recognised
+    idempotency_key = forms.CharField(
+        widget=forms.HiddenInput, required=False, max_length=64, initial=lambda: uuid.uuid4().hex
+    )
+
     class Meta:
         model = PayoutRequest
         fields = ['amount']
@@ -84,51 +93,167 @@ class UserRegistrationForm(forms.ModelForm):
         cleaned_data = super().clean()
         password = cleaned_data.get("password")
         confirm_password = cleaned_data.get("confirm_password")
-        employee_code = cleaned_data.get('employee_code')
 
         # Check password confirmation
         if password != confirm_password:
             raise forms.ValidationError("Passwords do not match.")
 
-        # Check if the username already exists
-        username = self.cleaned_data.get('username')
-        if CustomUser.objects.filter(username=username).exists():
-            raise forms.ValidationError("This username is already taken. Please choose another one.")
+        username = cleaned_data.get('username')
+        employee_code = cleaned_data.get('employee_code')
+        if username and employee_code:
+            self.employee = self.resolve_employee(username, employee_code)
+        return cleaned_data
 
-        # Validate employee code existence
-        try:
-            employee = Employee.objects.get(employee_code=employee_code)
-        except Employee.DoesNotExist:
+    def resolve_employee(self, username, employee_code):
+        """
+        The employee for the code, checking in the same query that it is not registered
+        yet and that the username is free.
+        """
+        employee = (
+            Employee.objects.filter(employee_code=employee_code)
+            .annotate(
+                registered=Exists(CustomUser.objects.filter(employee=OuterRef('pk'))),
+                username_taken=Exists(CustomUser.objects.filter(username=username)),
+            )
+            .first()
+        )
+        if employee is None:
             raise forms.ValidationError("Invalid employee code.")
-
-        # Check if the employee is already registered with another user
-        if CustomUser.objects.filter(employee=employee).exists():
+        if employee.username_taken:
+            raise forms.ValidationError("This username is already taken. Please choose another one.")
+        if employee.registered:
             raise forms.ValidationError("This employee is already registered with another user.")
+        return employee
 
-        return cleaned_data
+    def validate_unique(self):
+        # Username uniqueness is checked by `resolve_employee` and enforced by the database
+        pass
 
     def save(self, commit=True):
         """
         Save the user and associate with the corresponding employee. Assign groups if necessary.
+
+        Raises IntegrityError when another signup took the username or the employee
+        after validation; see `registration_conflict`.
         """
         # Create user instance but don't save to the database yet
         user = super().save(commit=False)
         user.set_password(self.cleaned_data["password"])  # Hash the password
-
-        # Associate user with the employee using the provided employee code
-        employee_code = self.cleaned_data["employee_code"]
-        try:
-            employee = Employee.objects.get(employee_code=employee_code)
-            user.employee = employee  # Link the employee to the user
-        except Employee.DoesNotExist:
-            raise forms.ValidationError("Invalid employee code.")
+        user.employee = self.employee  # Link the employee resolved in clean()
 
         if commit:
-            user.save()
+            with transaction.atomic():
+                user.save()
 
-            # Assign user to the Accountant group if the employee's position matches
-            if employee.position == "Accountant":
-                group, created = Group.objects.get_or_create(name="Accountant")
-                user.groups.add(group)
+                # Assign user to the Accountant group if the employee's position matches
+                if self.employee.position == "Accountant":
+                    user.groups.add(accountant_group_id())
 
         return user
+
+    def registration_conflict(self):
+        """
+        The validation message for a signup that lost a race in `save`.
+        """
+        try:
+            self.resolve_employee(self.cleaned_data['username'], self.cleaned_data['employee_code'])
+        except forms.ValidationError as error:
+            return error.messages[0]
+        return "Registration failed. Please try again."
+
+class PayoutExportForm(forms.Form):
+    """
+    Filters for exporting processed payouts.
+    """
+    format = forms.ChoiceField(choices=[('csv', 'CSV'), ('jsonl', 'JSON Lines')], initial='csv', required=False)
+    start = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
+    end = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
+    employee = forms.IntegerField(required=False, min_value=1, widget=forms.NumberInput(attrs={'class': 'form-control'}))
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start, end = cleaned_data.get('start'), cleaned_data.get('end')
+        if start and end and start > end:
+            raise forms.ValidationError("The start date must not be after the end date.")
+        cleaned_data['format'] = cleaned_data.get('format') or 'csv'
+        return cleaned_data
+
+
+class EmployeeSearchForm(forms.Form):
+    """
+    Search and filters of the employee list.
+    """
+    q = forms.CharField(
+        required=False, max_length=100, label="Name or code",
+        widget=forms.TextInput(attrs={'class': 'form-control', 'type': 'search', 'placeholder': 'Name or employee code'}),
+    )
+    position = forms.CharField(required=False, max_length=100, widget=forms.TextInput(attrs={'class': 'form-control'}))
+    is_active = forms.TypedChoiceField(
+        required=False, label="Status", empty_value=None,
+        choices=[('', 'Any'), ('true', 'Active'), ('false', 'Inactive')], coerce=lambda value: value == 'true',
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+    hired_from = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
+    hired_to = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
+    salary_min = forms.DecimalField(
+        required=False, min_value=0, max_digits=10, decimal_places=2,
+        widget=forms.NumberInput(attrs={'class': 'form-control'}),
+    )
+    salary_max = forms.DecimalField(
+        required=False, min_value=0, max_digits=10, decimal_places=2,
+        widget=forms.NumberInput(attrs={'class': 'form-control'}),
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        hired_from, hired_to = cleaned_data.get('hired_from'), cleaned_data.get('hired_to')
+        if hired_from and hired_to and hired_from > hired_to:
+            raise forms.ValidationError("The hire date range is empty.")
+        salary_min, salary_max = cleaned_data.get('salary_min'), cleaned_data.get('salary_max')
+        if salary_min is not None and salary_max is not None and salary_min > salary_max:
+            raise forms.ValidationError("The salary range is empty.")
+        return cleaned_data
+
+
+class PayoutReportForm(forms.Form):
+    """
+    Month range and position filters of the payout reports; months are given as YYYY-MM.
+    """
+    start = forms.DateField(
+        required=False, input_formats=['%Y-%m'],
+        widget=forms.DateInput(format='%Y-%m', attrs={'class': 'form-control', 'type': 'month'}),
+    )
+    end = forms.DateField(
+        required=False, input_formats=['%Y-%m'],
+        widget=forms.DateInput(format='%Y-%m', attrs={'class': 'form-control', 'type': 'month'}),
+    )
+    position = forms.CharField(required=False, max_length=100, widget=forms.TextInput(attrs={'class': 'form-control'}))
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start, end = cleaned_data.get('start'), cleaned_data.get('end')
+        if start and end and start > end:
+            raise forms.ValidationError("The start month must not be after the end month.")
+        return cleaned_data
+
+
+class EmployeeImportForm(forms.Form):
+    """
+    Upload of a CSV or JSON Lines file of employees.
+    """
+    file = forms.FileField(widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,.jsonl'}))
+    format = forms.ChoiceField(
+        choices=[('', 'From file extension'), ('csv', 'CSV'), ('jsonl', 'JSON Lines')], required=False,
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+    dry_run = forms.BooleanField(required=False, label="Only validate")
+
+    def clean(self):
+        cleaned_data = super().clean()
+        upload = cleaned_data.get('file')
+        if upload is not None and not cleaned_data.get('format'):
+            extension = upload.name.rsplit('.', 1)[-1].lower() if '.' in upload.name else ''
+            if extension not in ('csv', 'jsonl'):
+                raise forms.ValidationError("Choose a format; it cannot be told from the file name.")
+            cleaned_data['format'] = extension
+        return cleaned_data
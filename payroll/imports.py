@@ -0,0 +1,132 @@
+"""
+Streaming bulk import of employees from CSV or JSON Lines.
+
+Rows are read one at a time, validated with the EmployeeForm rules and inserted with
+`bulk_create` a batch at a time, so memory depends on the batch size and not on the
+file size. Invalid rows are skipped and handed to an `on_error` callback with their
+line number, which is how callers build their error reports.
+"""
+import csv
+import io
+import json
+from dataclasses import dataclass
+
+from django.db import transaction
+
+from .forms import EmployeeForm
+from .codes import assign_codes
+from .models import Employee
+
+FIELDS = ('first_name', 'last_name', 'position', 'salary_rate', 'hire_date', 'is_active')
+FORMATS = ('csv', 'jsonl')
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    failed: int = 0
+
+
+def csv_rows(stream):
+    """
+    (line number, row dict) pairs from a CSV text stream with a header line.
+    """
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def jsonl_rows(stream):
+    """
+    (line number, row dict) pairs from a JSON Lines text stream; blank lines are skipped.
+    A line that is not a JSON object is returned as a string to be reported.
+    """
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, f"Invalid JSON: {e}"
+            continue
+        yield line_number, row if isinstance(row, dict) else "Each line must be a JSON object."
+
+
+def read_rows(stream, import_format):
+    if import_format == 'csv':
+        return csv_rows(stream)
+    if import_format == 'jsonl':
+        return jsonl_rows(stream)
+    raise ValueError(f"Unsupported import format: {import_format}")
+
+
+def text_stream(binary_file):
+    """
+    Decode an uploaded (binary) file lazily; a UTF-8 byte order mark is ignored.
+    """
+    return io.TextIOWrapper(binary_file, encoding='utf-8-sig', newline='')
+
+
+def validate_row(row):
+    """
+    The Employee for a row, or the form's errors as a {field: [messages]} dict.
+    """
+    data = {name: row.get(name) for name in FIELDS}
+    # Employees are active unless the row says otherwise
+    if data['is_active'] in (None, ''):
+        data['is_active'] = True
+    form = EmployeeForm(data)
+    if not form.is_valid():
+        return None, {field: list(messages) for field, messages in form.errors.items()}
+    return Employee(**{name: form.cleaned_data[name] for name in FIELDS}), None
+
+
+def _insert(batch):
+    with transaction.atomic():
+        # Codes come from one block allocation, so the batch needs no uniqueness check
+        Employee.objects.bulk_create(assign_codes(batch))
+
+
+def import_employees(stream, import_format, batch_size=1000, dry_run=False, on_error=None):
+    """
+    Validate and insert the employees in a CSV or JSONL text stream.
+
+    Each batch of `batch_size` valid rows is inserted in its own transaction.
+    `on_error(line_number, errors)` is called for every invalid row, with `errors` a
+    {field: [messages]} dict. With `dry_run` rows are validated but nothing is written.
+    """
+    result = ImportResult()
+    batch = []
+    for line_number, row in read_rows(stream, import_format):
+        if isinstance(row, str):
+            employee, errors = None, {'__all__': [row]}
+        else:
+            employee, errors = validate_row(row)
+        if errors:
+            result.failed += 1
+            if on_error is not None:
+                on_error(line_number, errors)
+            continue
+
+        batch.append(employee)
+        if len(batch) >= batch_size:
+            if not dry_run:
+                _insert(batch)
+            result.created += len(batch)
+            batch = []
+
+    if batch:
+        if not dry_run:
+            _insert(batch)
+        result.created += len(batch)
+    return result
+
+
+def format_errors(errors):
+    """
+    One line of text for a row's {field: [messages]} errors.
+    """
+    return '; '.join(
+        f"{field}: {' '.join(messages)}" if field != '__all__' else ' '.join(messages)
+        for field, messages in errors.items()
+    )
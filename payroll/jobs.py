@@ -0,0 +1,224 @@
+"""
+Database-backed queue for payout processing.
+
+Web requests only insert PayoutJob rows, one per JOB_SIZE requests, so several
+workers share a large run; `manage.py payout_worker` processes queued jobs with
+`process_payout_requests`. Workers claim a job with `SELECT ... FOR UPDATE SKIP
+LOCKED` where the database supports it, and always finish the claim with a
+conditional UPDATE on the status, so two workers never run the same job (SQLite has
+no row locks and relies on the UPDATE alone). While it runs, the worker renews the
+job's lease every HEARTBEAT; a job whose worker died is picked up again once its
+lease runs out, and the outcome is only recorded by the worker still holding the
+claim. A job that raises is retried with exponential backoff and ends up `Dead` after
+`max_attempts`. Re-running a job is harmless because already processed requests are
+skipped.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from contextlib import contextmanager, nullcontext
+from datetime import timedelta
+
+from django.db import DatabaseError, connections, router, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import PayoutJob, PayoutRequest
+from .payouts import process_payout_requests
+
+BACKOFF_SECONDS = 5
+MAX_BACKOFF_SECONDS = 3600
+LEASE = timedelta(minutes=15)
+HEARTBEAT = timedelta(minutes=1)
+# Payout requests per job: one transaction's worth (see process_payout_requests)
+JOB_SIZE = 1000
+# Failures kept in a job's result; the count is always complete
+REPORTED_FAILURES = 100
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(request_ids=None, user=None, job_size=None):
+    """
+    Queue the given payout requests (or every one pending now) for processing, as one
+    job per `job_size` (JOB_SIZE) requests; returns the jobs.
+    """
+    job_size = job_size or JOB_SIZE
+    if request_ids is None:
+        # An employee's requests stay together, mostly in one job
+        request_ids = list(
+            PayoutRequest.objects.filter(status='Pending')
+            .order_by('employee_id', 'requested_at', 'pk')
+            .values_list('pk', flat=True)
+        )
+    else:
+        request_ids = sorted({int(pk) for pk in request_ids})
+    return PayoutJob.objects.bulk_create(
+        PayoutJob(request_ids=request_ids[start:start + job_size], created_by=user)
+        for start in range(0, len(request_ids), job_size)
+    )
+
+
+def describe(job):
+    """
+    JSON-ready status of a job, for the status endpoint.
+    """
+    return {
+        'id': job.pk,
+        'status': job.status,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'run_after': job.run_after.isoformat(),
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'result': job.result,
+        # The last line of the traceback is enough for a client; the rest stays in the database
+        'error': job.last_error.strip().splitlines()[-1] if job.last_error else None,
+    }
+
+
+def default_worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _claimed(job):
+    """
+    The job's row, as long as this claim of it (not a later one) still holds it.
+    """
+    return PayoutJob.objects.filter(
+        pk=job.pk, status=PayoutJob.RUNNING, locked_by=job.locked_by, attempts=job.attempts,
+    )
+
+
+def claim_job(worker_id):
+    """
+    Mark the oldest due job as running for `worker_id` and return it, or None.
+    """
+    now = timezone.now()
+    due = PayoutJob.objects.filter(
+        Q(status=PayoutJob.QUEUED, run_after__lte=now)
+        | Q(status=PayoutJob.RUNNING, locked_at__lt=now - LEASE)
+    )
+    # Without row locks (SQLite) the read and the UPDATE run in autocommit: upgrading a
+    # read transaction to a write fails at once instead of waiting for the lock
+    locking = connections[router.db_for_write(PayoutJob)].features.has_select_for_update
+    # A few tries: another worker can win the race for the same candidate
+    for _ in range(5):
+        with transaction.atomic() if locking else nullcontext():
+            candidate = (
+                due.select_for_update(skip_locked=True)
+                .order_by('run_after', 'pk')
+                .values_list('pk', 'status', 'locked_at')
+                .first()
+            )
+            if candidate is None:
+                return None
+            pk, status, locked_at = candidate
+            claimed = PayoutJob.objects.filter(pk=pk, status=status, locked_at=locked_at).update(
+                status=PayoutJob.RUNNING, locked_by=worker_id, locked_at=now, attempts=F('attempts') + 1,
+            )
+        if not claimed:
+            continue
+        job = PayoutJob.objects.get(pk=pk)
+        if job.attempts <= job.max_attempts:
+            return job
+        # Every earlier worker died while running it
+        _claimed(job).update(
+            status=PayoutJob.DEAD, finished_at=now,
+            last_error=job.last_error or "The worker running this job stopped before it finished.",
+        )
+    return None
+
+
+def backoff(attempts):
+    """
+    Seconds to wait before retrying a job that has failed `attempts` times.
+    """
+    return min(BACKOFF_SECONDS * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS)
+
+
+@contextmanager
+def heartbeat(job, interval=None):
+    """
+    Renew the lease of a claimed job every `interval` (HEARTBEAT) while the block runs,
+    so other workers do not take a long job for abandoned.
+    """
+    interval = (interval or HEARTBEAT).total_seconds()
+    stopped = threading.Event()
+
+    def beat():
+        try:
+            while not stopped.wait(interval):
+                try:
+                    if not _claimed(job).update(locked_at=timezone.now()):
+                        logger.warning("Payout job %s was claimed by another worker", job.pk)
+                        return
+                except DatabaseError:
+                    logger.exception("Could not renew the lease of payout job %s", job.pk)
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=beat, name=f'payout-job-{job.pk}-heartbeat', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def run_job(job):
+    """
+    Process a claimed job and record its outcome, unless another worker has claimed the
+    job meanwhile; returns the job as stored.
+    """
+    try:
+        with heartbeat(job):
+            result = process_payout_requests(job.request_ids)
+    except Exception:
+        outcome = {'last_error': traceback.format_exc(), 'locked_by': '', 'locked_at': None}
+        if job.attempts >= job.max_attempts:
+            outcome.update(status=PayoutJob.DEAD, finished_at=timezone.now())
+        else:
+            outcome.update(status=PayoutJob.QUEUED, run_after=timezone.now() + timedelta(seconds=backoff(job.attempts)))
+    else:
+        outcome = {
+            'status': PayoutJob.DONE,
+            'finished_at': timezone.now(),
+            'result': {
+                'processed': len(result.processed),
+                'failed': len(result.failed),
+                'failures': {str(pk): reason for pk, reason in list(result.failed.items())[:REPORTED_FAILURES]},
+            },
+        }
+
+    if not _claimed(job).update(**outcome):
+        logger.warning("Payout job %s was claimed by another worker; its outcome is theirs to record", job.pk)
+    job.refresh_from_db()
+    return job
+
+
+def work(worker_id=None, poll_interval=1.0, burst=False, max_jobs=None, should_stop=lambda: False):
+    """
+    Claim and run jobs until `should_stop()` is true, `max_jobs` have run or, with
+    `burst`, the queue has no due jobs left. Returns the number of jobs run.
+    """
+    worker_id = worker_id or default_worker_id()
+    done = 0
+    while not should_stop() and (max_jobs is None or done < max_jobs):
+        try:
+            job = claim_job(worker_id)
+        except DatabaseError:
+            logger.exception("Could not claim a payout job")
+            job = None
+        if job is None:
+            if burst:
+                break
+            time.sleep(poll_interval)
+            continue
+        run_job(job)
+        done += 1
+    return done
@@ -0,0 +1,141 @@
+"""
+Append-only earnings ledger.
+
+Every change to an employee's balance is a LedgerEntry: accruals and adjustments are
+credits (positive amounts), payouts are debits (negative amounts). Entries are never
+updated or deleted. The current balance is the employee's latest BalanceSnapshot plus
+the entries appended after it (see `EmployeeQuerySet.with_balance`); `compact_ledger`
+rolls older entries into fresh snapshots so that sum stays short.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connections, router, transaction
+from django.db.models import BigIntegerField, CharField, DateTimeField, Exists, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import BALANCE_FIELD, CENTS, BalanceSnapshot, Employee, LedgerEntry
+
+
+def post_entry(employee_id, kind, amount, **references):
+    """
+    Append one entry. `references` may carry `payout_request_id` / `payroll_run_id`.
+    """
+    return LedgerEntry.objects.create(employee_id=employee_id, kind=kind, amount=amount, **references)
+
+
+def post_for_queryset(employees, kind, amount, payroll_run_id=None):
+    """
+    Append one entry per employee in `employees`, with `amount` an expression over
+    Employee columns, as a single INSERT ... SELECT. No rows pass through Python.
+    Returns the number of entries written.
+    """
+    using = router.db_for_write(LedgerEntry)
+    select = (
+        employees.using(using).order_by()
+        .annotate(
+            ledger_kind=Value(kind, output_field=CharField()),
+            ledger_amount=amount,
+            ledger_run=Value(payroll_run_id, output_field=BigIntegerField()),
+            ledger_created_at=Value(timezone.now(), output_field=DateTimeField()),
+        )
+        .values_list('pk', 'ledger_kind', 'ledger_amount', 'ledger_run', 'ledger_created_at')
+    )
+    sql, params = select.query.sql_with_params()
+
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    opts = LedgerEntry._meta
+    columns = ', '.join(
+        quote(opts.get_field(name).column)
+        for name in ('employee', 'kind', 'amount', 'payroll_run', 'created_at')
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {quote(opts.db_table)} ({columns}) {sql}', params)
+        return cursor.rowcount
+
+
+def balances(employee_ids):
+    """
+    Current balance of each of the given employees, in one query.
+    """
+    return {
+        pk: value.quantize(CENTS)
+        for pk, value in Employee.objects.with_balance().filter(pk__in=employee_ids).values_list('pk', 'ledger_balance')
+    }
+
+
+def balance(employee_id):
+    return balances([employee_id]).get(employee_id, Decimal(0))
+
+
+def compact_ledger(older_than=timedelta(days=30), batch_size=1000, keep_history=False):
+    """
+    Roll ledger entries older than `older_than` into new balance snapshots.
+
+    For every employee with such entries after their latest snapshot, a snapshot is
+    written that covers everything up to the newest old-enough entry. Entries themselves
+    are kept as the audit trail; superseded snapshots are deleted unless `keep_history`.
+    Returns the number of snapshots written.
+    """
+    # The age margin also means no transaction still in flight can hold an entry id below the cutoff
+    cutoff_id = (
+        LedgerEntry.objects.filter(created_at__lt=timezone.now() - older_than)
+        .aggregate(cutoff=Max('pk'))['cutoff']
+    )
+    if cutoff_id is None:
+        return 0
+
+    latest_entry_id = Coalesce(
+        Subquery(
+            BalanceSnapshot.objects.filter(employee=OuterRef('pk'))
+            .order_by('-last_entry_id')
+            .values('last_entry_id')[:1]
+        ),
+        Value(0),
+    )
+    latest_balance = Coalesce(
+        Subquery(
+            BalanceSnapshot.objects.filter(employee=OuterRef('pk'))
+            .order_by('-last_entry_id')
+            .values('balance')[:1]
+        ),
+        Value(0),
+        output_field=BALANCE_FIELD,
+    )
+    employee_ids = list(
+        Employee.objects.alias(snapshot_entry_id=latest_entry_id)
+        .filter(Exists(LedgerEntry.objects.filter(
+            employee=OuterRef('pk'), pk__gt=OuterRef('snapshot_entry_id'), pk__lte=cutoff_id,
+        )))
+        .order_by('pk')
+        .values_list('pk', flat=True)
+    )
+
+    written = 0
+    for start in range(0, len(employee_ids), batch_size):
+        batch = employee_ids[start:start + batch_size]
+        with transaction.atomic():
+            delta = (
+                LedgerEntry.objects.filter(
+                    employee=OuterRef('pk'), pk__gt=OuterRef('snapshot_entry_id'), pk__lte=cutoff_id,
+                )
+                .order_by()
+                .values('employee')
+                .annotate(total=Sum('amount'))
+                .values('total')
+            )
+            rows = (
+                Employee.objects.filter(pk__in=batch)
+                .alias(snapshot_entry_id=latest_entry_id)
+                .annotate(snapshot_balance=latest_balance + Coalesce(Subquery(delta), Value(0), output_field=BALANCE_FIELD))
+                .values_list('pk', 'snapshot_balance')
+            )
+            BalanceSnapshot.objects.bulk_create(
+                BalanceSnapshot(employee_id=pk, balance=value, last_entry_id=cutoff_id) for pk, value in rows
+            )
+            if not keep_history:
+                BalanceSnapshot.objects.filter(employee_id__in=batch, last_entry_id__lt=cutoff_id).delete()
+        written += len(batch)
+    return written
@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from payroll.archive import archive_processed
+
+
+class Command(BaseCommand):
+    help = "Move processed payout requests older than the archive horizon to the archive table, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days', type=int,
+            help='Archive requests processed at least this many days ago (default: PAYROLL_ARCHIVE_AFTER_DAYS).',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='Requests moved per transaction.')
+        parser.add_argument('--max-batches', type=int, help='Stop after this many batches.')
+
+    def handle(self, *args, **options):
+        if options['older_than_days'] is not None and options['older_than_days'] < 0:
+            raise CommandError("--older-than-days must not be negative.")
+        if options['batch_size'] < 1 or (options['max_batches'] is not None and options['max_batches'] < 1):
+            raise CommandError("--batch-size and --max-batches must be positive.")
+
+        archived = archive_processed(
+            older_than=None if options['older_than_days'] is None else timedelta(days=options['older_than_days']),
+            batch_size=options['batch_size'],
+            max_batches=options['max_batches'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} processed payout request(s)."))
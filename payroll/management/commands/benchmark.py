@@ -0,0 +1,139 @@
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+from datetime import date, datetime, timezone
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from payroll import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database and measure the payroll hot paths. "
+        "Results are written as JSON so runs can be compared."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--employees', type=int, default=1000, help='Employees to seed.')
+        parser.add_argument('--requests-per-employee', type=int, default=3, help='Payout requests to seed per employee.')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for the dataset.')
+        parser.add_argument('--iterations', type=int, default=20, help='Measured requests per view.')
+        parser.add_argument('--process-count', type=int, default=200, help='Payout requests processed per processing benchmark.')
+        parser.add_argument('--workers', type=int, default=4, help='Threads for the concurrent benchmarks.')
+        parser.add_argument('--registrations', type=int, default=20, help='Signups per registration benchmark.')
+        parser.add_argument('--output', default='-', help="Where to write the JSON results ('-' for stdout).")
+        parser.add_argument('--keepdb', action='store_true', help='Reuse the test database between runs.')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError("--workers must be positive.")
+
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        directory = self.use_file_database()
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False, keepdb=options['keepdb'])
+        try:
+            results = self.run_benchmarks(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+            if directory is not None:
+                directory.cleanup()
+
+        results['failures'] = failures(results)
+        for name, count in results['failures'].items():
+            self.stderr.write(self.style.WARNING(f"{name}: {count} operation(s) failed and are not in its throughput."))
+
+        report = json.dumps(results, indent=2, default=str)
+        if options['output'] == '-':
+            self.stdout.write(report)
+        else:
+            with open(options['output'], 'w') as output:
+                output.write(report)
+            self.stderr.write(f"Results written to {options['output']}")
+
+    def use_file_database(self):
+        """
+        Put a SQLite test database in a temporary file, returning the directory. The
+        default in-memory one shares a single table lock between threads, so concurrent
+        writers fail with "database table is locked" instead of waiting their turn.
+        """
+        test_settings = connection.settings_dict['TEST']
+        in_memory = connection.vendor == 'sqlite' and connection.creation.is_in_memory_db(test_settings['NAME'] or ':memory:')
+        if not in_memory:
+            return None
+        directory = tempfile.TemporaryDirectory(prefix='payroll-benchmark-')
+        test_settings['NAME'] = os.path.join(directory.name, 'benchmark.sqlite3')
+        return directory
+
+    def log(self, message):
+        self.stderr.write(message)
+
+    def run_benchmarks(self, options):
+        results = {
+            'meta': {
+                'started_at': datetime.now(timezone.utc).isoformat(),
+                'python': sys.version.split()[0],
+                'django': django.get_version(),
+                'platform': platform.platform(),
+                'database': connection.vendor,
+                'dataset': {
+                    'employees': options['employees'],
+                    'requests_per_employee': options['requests_per_employee'],
+                    'seed': options['seed'],
+                },
+            },
+        }
+
+        self.log("Seeding dataset...")
+        call_command(
+            'populate',
+            employees=options['employees'],
+            requests_per_employee=options['requests_per_employee'],
+            seed=options['seed'],
+            as_of=date(2024, 12, 1),
+            stdout=io.StringIO(),
+        )
+
+        self.log("Measuring views...")
+        results['views'] = benchmarks.bench_views(options['iterations'])
+
+        count = options['process_count']
+        self.log("Measuring payout processing...")
+        results['process_request'] = {
+            'single_thread': benchmarks.bench_process_request(benchmarks.take_pending(count)),
+            'concurrent': benchmarks.bench_process_request(benchmarks.take_pending(count), workers=options['workers']),
+        }
+        results['batch_processing'] = benchmarks.bench_batch_processing(benchmarks.take_pending(count))
+
+        self.log("Measuring registration...")
+        results['registration'] = {
+            'single_thread': benchmarks.bench_registration(options['registrations']),
+            'concurrent': benchmarks.bench_registration(options['registrations'], workers=options['workers']),
+            'racing': benchmarks.bench_registration_race(options['registrations'], workers=options['workers']),
+        }
+
+        results['meta']['finished_at'] = datetime.now(timezone.utc).isoformat()
+        return results
+
+
+def failures(results):
+    """
+    Failed operations of every benchmark that had any, by dotted path in the results.
+    """
+    found = {}
+    for name, value in results.items():
+        if not isinstance(value, dict) or name == 'meta':
+            continue
+        for key in ('failed', 'errors'):
+            if value.get(key):
+                found[name] = value[key]
+        found.update({f'{name}.{key}': count for key, count in failures(value).items()})
+    return found
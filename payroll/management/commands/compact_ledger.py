@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from payroll.ledger import compact_ledger
+
+
+class Command(BaseCommand):
+    help = "Roll old earnings ledger entries into balance snapshots so balance reads stay cheap."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=30, help='Only compact entries at least this old.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Employees snapshotted per transaction.')
+        parser.add_argument('--keep-history', action='store_true', help='Keep superseded snapshots.')
+
+    def handle(self, *args, **options):
+        if options['older_than_days'] < 0 or options['batch_size'] < 1:
+            raise CommandError("--older-than-days must not be negative and --batch-size must be positive.")
+
+        written = compact_ledger(
+            older_than=timedelta(days=options['older_than_days']),
+            batch_size=options['batch_size'],
+            keep_history=options['keep_history'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} balance snapshot(s)."))
@@ -0,0 +1,99 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from payroll import benchmarks
+
+# Environment of each database profile (see payroll_system/db.py)
+PROFILES = {
+    'sqlite-default': {'PAYROLL_SQLITE_TUNING': 'False'},
+    'sqlite-tuned': {'PAYROLL_SQLITE_TUNING': 'True'},
+    'postgres-direct': {'DB_POOL': 'False', 'DB_CONN_MAX_AGE': '0'},
+    'postgres-persistent': {'DB_POOL': 'False', 'DB_CONN_MAX_AGE': '60'},
+    'postgres-pooled': {'DB_POOL': 'True'},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Run concurrent payout traffic against the database under each connection profile and "
+        "report throughput, latency and 'database is locked' failures as JSON. SQLite profiles "
+        "get a fresh database file each; PostgreSQL profiles need --database-url."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', nargs='+', choices=sorted(PROFILES), default=['sqlite-default', 'sqlite-tuned'])
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent threads.')
+        parser.add_argument('--operations', type=int, default=400, help='Operations per profile.')
+        parser.add_argument('--employees', type=int, default=20, help='Employees the operations are spread over.')
+        parser.add_argument('--database-url', default='', help='PostgreSQL database for the postgres-* profiles.')
+        parser.add_argument('--output', default='-', help="Where to write the JSON results ('-' for stdout).")
+        # Internal: run the workload in this process against the configured database
+        parser.add_argument('--workload', action='store_true', help='(internal) Run one profile in this process.')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['operations'] < 1 or options['employees'] < 1:
+            raise CommandError("--workers, --operations and --employees must be positive.")
+
+        if options['workload']:
+            result = benchmarks.bench_database_concurrency(
+                options['workers'], options['operations'], options['employees'],
+            )
+            self.stdout.write(json.dumps(result))
+            return
+
+        results = {
+            'meta': {
+                'started_at': datetime.now(timezone.utc).isoformat(),
+                'workers': options['workers'],
+                'operations': options['operations'],
+                'employees': options['employees'],
+            },
+        }
+        for name in options['profiles']:
+            self.stderr.write(f"Running {name}...")
+            results[name] = self.run_profile(name, options)
+        results['meta']['finished_at'] = datetime.now(timezone.utc).isoformat()
+
+        report = json.dumps(results, indent=2)
+        if options['output'] == '-':
+            self.stdout.write(report)
+        else:
+            with open(options['output'], 'w') as output:
+                output.write(report)
+            self.stderr.write(f"Results written to {options['output']}")
+
+    def run_profile(self, name, options):
+        """
+        Migrate the profile's database and run the workload in a child process, so the
+        database settings are read from the profile's environment.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            if name.startswith('postgres'):
+                if not options['database_url']:
+                    raise CommandError(f"--database-url is required for {name}.")
+                database_url = options['database_url']
+            else:
+                database_url = os.path.join(directory, 'benchmark.sqlite3')
+            env = {**os.environ, **PROFILES[name], 'DATABASE_URL': database_url, 'PAYROLL_READ_REPLICAS': ''}
+
+            manage = [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py')]
+            self.run(manage + ['migrate', '--verbosity', '0'], env)
+            output = self.run(manage + [
+                'db_benchmark', '--workload',
+                '--workers', str(options['workers']),
+                '--operations', str(options['operations']),
+                '--employees', str(options['employees']),
+            ], env)
+        return json.loads(output)
+
+    def run(self, command, env):
+        completed = subprocess.run(command, env=env, cwd=settings.BASE_DIR, capture_output=True, text=True)
+        if completed.returncode:
+            raise CommandError(f"{' '.join(command[1:])} failed:\n{completed.stderr}")
+        return completed.stdout
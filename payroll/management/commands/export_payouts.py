@@ -0,0 +1,34 @@
+import sys
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from payroll import exports
+
+
+class Command(BaseCommand):
+    help = 'Stream processed payouts to a CSV or JSON Lines file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(exports.FORMATS), default='csv', help='Output format.')
+        parser.add_argument('--start', type=date.fromisoformat, help='First processed date to include (YYYY-MM-DD).')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last processed date to include (YYYY-MM-DD).')
+        parser.add_argument('--employee', type=int, help='Only export payouts of this employee id.')
+        parser.add_argument('--output', default='-', help="Output file ('-' for stdout).")
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched from the database at a time.')
+
+    def handle(self, *args, **options):
+        if options['start'] and options['end'] and options['start'] > options['end']:
+            raise CommandError("--start must not be after --end.")
+
+        querysets = exports.processed_payouts(
+            start=options['start'], end=options['end'], employee_id=options['employee'],
+        )
+        lines = exports.export_lines(querysets, options['format'], chunk_size=options['chunk_size'])
+
+        output = sys.stdout if options['output'] == '-' else open(options['output'], 'w', newline='')
+        try:
+            for line in lines:
+                output.write(line)
+        finally:
+            if output is not sys.stdout:
+                output.close()
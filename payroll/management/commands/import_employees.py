@@ -0,0 +1,55 @@
+import csv
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from payroll import imports
+
+
+class Command(BaseCommand):
+    help = 'Stream employees from a CSV or JSON Lines file into the database, reporting invalid rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import ('-' for stdin).")
+        parser.add_argument('--format', choices=imports.FORMATS, help='Input format (default: from the file extension).')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Employees inserted per transaction.')
+        parser.add_argument('--dry-run', action='store_true', help='Only validate the rows.')
+        parser.add_argument('--errors', default=None, help='Write the invalid rows to this CSV file (default: stderr).')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be positive.")
+        import_format = options['format'] or os.path.splitext(options['path'])[1].lstrip('.').lower()
+        if import_format not in imports.FORMATS:
+            raise CommandError("Pass --format; it cannot be told from the file name.")
+
+        if options['path'] == '-':
+            stream = sys.stdin
+        else:
+            try:
+                stream = open(options['path'], encoding='utf-8-sig', newline='')
+            except OSError as e:
+                raise CommandError(e)
+        report = open(options['errors'], 'w', newline='') if options['errors'] else None
+        writer = csv.writer(report) if report is not None else None
+
+        def on_error(line, errors):
+            if writer is not None:
+                writer.writerow([line, imports.format_errors(errors)])
+            else:
+                self.stderr.write(f"Line {line}: {imports.format_errors(errors)}")
+
+        try:
+            if writer is not None:
+                writer.writerow(['line', 'errors'])
+            result = imports.import_employees(
+                stream, import_format, batch_size=options['batch_size'], dry_run=options['dry_run'], on_error=on_error,
+            )
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            if report is not None:
+                report.close()
+
+        verb = 'Validated' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(f"{verb} {result.created} employee(s); {result.failed} invalid row(s)."))
@@ -0,0 +1,115 @@
+import json
+import os
+import shlex
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+from payroll import benchmarks
+from payroll.models import CustomUser
+
+# Server command templates and whether they get the async views
+SERVERS = {
+    # The current setup: Django's threaded WSGI server with the sync views
+    'wsgi': (f'{sys.executable} manage.py runserver 127.0.0.1:{{port}} --noreload', False),
+    'asgi': ('uvicorn payroll_system.asgi:application --host 127.0.0.1 --port {port} --workers {workers} --no-access-log', True),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Start the site under a WSGI and an ASGI server in turn, load the read-heavy pages "
+        "concurrently as one user and report throughput and latency of each as JSON. "
+        "Uses the configured database, so seed it first (e.g. with `populate --seed 42`)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', required=True, help='User whose session makes the requests.')
+        parser.add_argument('--requests', type=int, default=500, help='Requests per page and server.')
+        parser.add_argument('--concurrency', type=int, default=16, help='Concurrent client threads.')
+        parser.add_argument('--workers', type=int, default=1, help='Server worker processes (ASGI server).')
+        parser.add_argument('--port', type=int, default=8765, help='Port the servers listen on.')
+        parser.add_argument('--servers', nargs='+', choices=sorted(SERVERS), default=['wsgi', 'asgi'])
+        for name, (command, _) in SERVERS.items():
+            parser.add_argument(
+                f'--{name}-command', default=command,
+                help=f'Command line for the {name.upper()} server; {{port}} and {{workers}} are filled in.',
+            )
+        parser.add_argument('--output', default='-', help="Where to write the JSON results ('-' for stdout).")
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1 or options['workers'] < 1:
+            raise CommandError("--requests, --concurrency and --workers must be positive.")
+        try:
+            user = CustomUser.objects.get(username=options['username'])
+        except CustomUser.DoesNotExist:
+            raise CommandError(f"No user named {options['username']!r}.")
+
+        client = Client()
+        client.force_login(user)
+        cookie = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+
+        paths = [reverse('payout_history_list'), reverse('payout_request_list')]
+        if user.employee_id is not None:
+            paths.insert(0, reverse('profile'))
+
+        results = {
+            'meta': {
+                'started_at': datetime.now(timezone.utc).isoformat(),
+                'username': user.username,
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'workers': options['workers'],
+            },
+        }
+        for name in options['servers']:
+            _, async_views = SERVERS[name]
+            command = options[f'{name}_command'].format(port=options['port'], workers=options['workers'])
+            self.stderr.write(f"Loading {name}: {command}")
+            results[name] = self.run_server(command, async_views, cookie, paths, options)
+        results['meta']['finished_at'] = datetime.now(timezone.utc).isoformat()
+
+        report = json.dumps(results, indent=2)
+        if options['output'] == '-':
+            self.stdout.write(report)
+        else:
+            with open(options['output'], 'w') as output:
+                output.write(report)
+            self.stderr.write(f"Results written to {options['output']}")
+
+    def run_server(self, command, async_views, cookie, paths, options):
+        env = {**os.environ, 'PAYROLL_ASYNC_VIEWS': '1' if async_views else '0'}
+        try:
+            server = subprocess.Popen(
+                shlex.split(command), cwd=settings.BASE_DIR, env=env,
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+        except FileNotFoundError as error:
+            raise CommandError(f"Cannot start the server ({error}); is it installed (e.g. `pip install uvicorn`)?")
+
+        try:
+            self.wait_for_port(server, options['port'])
+            base_url = f"http://127.0.0.1:{options['port']}"
+            benchmarks.http_load(base_url, paths, cookie, options['concurrency'], options['concurrency'])  # warm-up
+            return benchmarks.http_load(base_url, paths, cookie, options['requests'], options['concurrency'])
+        finally:
+            server.terminate()
+            server.wait()
+
+    def wait_for_port(self, server, port, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f"The server exited with status {server.returncode} before accepting connections.")
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f"The server did not start listening on port {port} within {timeout}s.")
@@ -0,0 +1,57 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from payroll import jobs
+
+
+def run_worker(options):
+    stopping = []
+    # Finish the current job on SIGTERM / Ctrl-C instead of abandoning it mid-way
+    signal.signal(signal.SIGTERM, lambda *args: stopping.append(True))
+    signal.signal(signal.SIGINT, lambda *args: stopping.append(True))
+    try:
+        return jobs.work(
+            poll_interval=options['poll_interval'],
+            burst=options['burst'],
+            max_jobs=options['max_jobs'],
+            should_stop=lambda: bool(stopping),
+        )
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Run queued payout processing jobs, optionally in several worker processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help='Worker processes to run.')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when the queue is empty.')
+        parser.add_argument('--burst', action='store_true', help='Exit once no due jobs are left.')
+        parser.add_argument('--max-jobs', type=int, default=None, help='Exit after running this many jobs (per worker).')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['poll_interval'] <= 0:
+            raise CommandError("--workers and --poll-interval must be positive.")
+
+        if options['workers'] == 1:
+            done = run_worker(options)
+            self.stdout.write(self.style.SUCCESS(f"Ran {done} job(s)."))
+            return
+
+        # Children must open their own connections rather than share the parent's
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        processes = [context.Process(target=run_worker, args=(options,), daemon=True) for _ in range(options['workers'])]
+        for process in processes:
+            process.start()
+        signal.signal(signal.SIGTERM, lambda *args: [process.terminate() for process in processes])
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            # The children got the same Ctrl-C and stop after their current job
+            for process in processes:
+                process.join()
+        self.stdout.write(self.style.SUCCESS(f"{len(processes)} worker(s) stopped."))
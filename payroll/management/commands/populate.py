@@ -1,90 +1,160 @@
-from django.core.management.base import BaseCommand
-from payroll.models import Employee, PayoutRequest, CustomUser
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from payroll.models import Employee, LedgerEntry, PayoutRequest, CustomUser
+from payroll.codes import assign_codes
+from payroll import reports
 from django.contrib.auth.models import Group
-from random import randint, choice
+from random import Random
 from decimal import Decimal
 from datetime import date, timedelta
 from dateutil.relativedelta import relativedelta
 from django.utils.timezone import now
 
+PASSWORD = 'Password123'
+
+
 class Command(BaseCommand):
     help = 'Populate the database with employees, users, and payout requests.'
 
-    def handle(self, *args, **kwargs):
-        positions = ["Software Engineer", "Designer", "Manager", "QA Specialist", "HR Specialist", "Accountant"]
-        first_names = ["John", "Jane", "Alice", "Bob", "Eve", "Tom", "Anna", "Chris", "Mike", "Sophia"]
-        last_names = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Martinez", "Lee", "Wilson", "Taylor"]
-
-        def calculate_available_earnings(hire_date, salary_rate):
-            """
-            Calculate available earnings for an employee based on their hire date and salary rate.
-            """
-            last_payout_date = hire_date + relativedelta(months=randint(2, 6))
-            months_since_last_payout = (date.today().year - last_payout_date.year) * 12 + (date.today().month - last_payout_date.month)
-            available_earnings = Decimal(months_since_last_payout) * salary_rate
-            return max(available_earnings, 0), last_payout_date
-
-        for i in range(10):
-            # Generate random employee details
-            first_name = choice(first_names)
-            last_name = choice(last_names)
-            position = choice(positions)
-            salary_rate = Decimal(randint(50000, 120000)) / 100
-            hire_date = date.today() - timedelta(days=randint(30, 365 * 5))
+    positions = ["Software Engineer", "Designer", "Manager", "QA Specialist", "HR Specialist", "Accountant"]
+    first_names = ["John", "Jane", "Alice", "Bob", "Eve", "Tom", "Anna", "Chris", "Mike", "Sophia"]
+    last_names = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Martinez", "Lee", "Wilson", "Taylor"]
+
+    def add_arguments(self, parser):
+        parser.add_argument('--employees', type=int, default=10, help='Number of employees (and users) to create.')
+        parser.add_argument(
+            '--requests-per-employee', type=int, default=None,
+            help='Payout requests per employee (default: 1 to 3 at random).'
+        )
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for reproducible datasets.')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Employees inserted per transaction.')
+        parser.add_argument(
+            '--as-of', type=date.fromisoformat, default=None,
+            help='Reference date (YYYY-MM-DD) for hire dates and earnings; defaults to today.'
+        )
+
+    def handle(self, *args, **options):
+        if options['employees'] < 0 or options['batch_size'] < 1:
+            raise CommandError("--employees must not be negative and --batch-size must be positive.")
+        if options['requests_per_employee'] is not None and options['requests_per_employee'] < 0:
+            raise CommandError("--requests-per-employee must not be negative.")
+
+        self.rng = Random(options['seed'])
+        self.seed = options['seed']
+        self.as_of = options['as_of'] or date.today()
+        self.requests_per_employee = options['requests_per_employee']
+        # Hashing is deliberately slow, so every generated user shares one hash
+        self.password_hash = make_password(PASSWORD)
+        self.accountant_group, _ = Group.objects.get_or_create(name="Accountant")
+
+        total = options['employees']
+        offset = Employee.objects.count()
+        created_employees = created_requests = 0
+        for start in range(0, total, options['batch_size']):
+            size = min(options['batch_size'], total - start)
+            employees, requests = self.create_batch(offset + start, size)
+            created_employees += employees
+            created_requests += requests
+            self.stdout.write(f"Created {created_employees}/{total} employees, {created_requests} payout requests")
+
+        # Bulk inserts bypass the models' summary changes
+        reports.rebuild()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {created_employees} employees and users, {created_requests} payout requests. "
+            f"All users share the password {PASSWORD!r}."
+        ))
+
+    def calculate_available_earnings(self, hire_date, salary_rate):
+        """
+        Calculate available earnings for an employee based on their hire date and salary rate.
+        """
+        last_payout_date = hire_date + relativedelta(months=self.rng.randint(2, 6))
+        months_since_last_payout = (self.as_of.year - last_payout_date.year) * 12 + (self.as_of.month - last_payout_date.month)
+        available_earnings = Decimal(months_since_last_payout) * salary_rate
+        return max(available_earnings, 0), last_payout_date
+
+    def create_batch(self, first_index, size):
+        rng = self.rng
+        timestamp = now()
+        employees, users, requests, balances = [], [], [], []
 
-            available_earnings, last_payout_date = calculate_available_earnings(hire_date, salary_rate)
+        for index in range(first_index, first_index + size):
+            # Generate random employee details
+            first_name = rng.choice(self.first_names)
+            last_name = rng.choice(self.last_names)
+            position = rng.choice(self.positions)
+            salary_rate = Decimal(rng.randint(50000, 120000)) / 100
+            hire_date = self.as_of - timedelta(days=rng.randint(30, 365 * 5))
 
-            # Create Employee
-            employee = Employee.objects.create(
+            available_earnings, _ = self.calculate_available_earnings(hire_date, salary_rate)
+            employee = Employee(
                 first_name=first_name,
                 last_name=last_name,
                 position=position,
                 salary_rate=salary_rate,
                 hire_date=hire_date,
-                available_earnings=available_earnings
             )
+            employees.append(employee)
+            balances.append(available_earnings)
 
-            # Create User Account
-            password = 'Password123'
-            user = CustomUser.objects.create_user(
-                username=f'{first_name.lower()}_{last_name.lower()}_{position}_{i}',
-                password=password,
+            users.append(CustomUser(
+                username=f'{first_name.lower()}_{last_name.lower()}_{position}_{index}',
+                password=self.password_hash,
                 first_name=first_name,
                 last_name=last_name,
-                email=f'{first_name.lower()}{last_name.lower()}@example.com'
-            )
-            user.employee = employee
-            user.save()
-
-            # Assign to Accountant group if position is Accountant
-            if position == "Accountant":
-                group, _ = Group.objects.get_or_create(name="Accountant")
-                user.groups.add(group)
+                email=f'{first_name.lower()}{last_name.lower()}@example.com',
+            ))
 
-            # Create Payout Requests
-            for _ in range(randint(1, 3)):
+            # Plan payout requests; about half of them get processed straight away
+            count = self.requests_per_employee
+            if count is None:
+                count = rng.randint(1, 3)
+            balance = available_earnings
+            for _ in range(count):
                 min_amount = 1000
-                max_amount = min(int(employee.available_earnings * 100), 50000)
-
+                max_amount = min(int(balance * 100), 50000)
                 if max_amount < min_amount:
                     continue
 
-                request_amount = Decimal(randint(min_amount, max_amount)) / 100
-                payout_request = PayoutRequest.objects.create(
-                    employee=employee,
-                    amount=request_amount,
-                    requested_at=now() - timedelta(days=randint(0, 30)),
-                    status='Pending'
-                )
-
-                # Randomly decide to process the request
-                if choice([True, False]):
-                    if payout_request.amount <= employee.available_earnings:
-                        employee.available_earnings -= payout_request.amount
-                        employee.save()
-
-                        payout_request.status = 'Processed'
-                        payout_request.processed_at = now()
-                        payout_request.save()
-
-            self.stdout.write(f"Created Employee: {employee}, Available Earnings: {available_earnings} USD")
+                payout_request = PayoutRequest(employee=employee, amount=Decimal(rng.randint(min_amount, max_amount)) / 100)
+                if rng.choice([True, False]) and payout_request.amount <= balance:
+                    balance -= payout_request.amount
+                    payout_request.status = 'Processed'
+                    payout_request.processed_at = timestamp
+                else:
+                    employee.pending_total += payout_request.amount
+                    employee.pending_count += 1
+                requests.append(payout_request)
+
+        with transaction.atomic():
+            Employee.objects.bulk_create(assign_codes(employees))
+            for user, employee in zip(users, employees):
+                user.employee = employee
+            CustomUser.objects.bulk_create(users)
+
+            Membership = CustomUser.groups.through
+            Membership.objects.bulk_create(
+                Membership(customuser_id=user.pk, group_id=self.accountant_group.pk)
+                for user, employee in zip(users, employees)
+                if employee.position == "Accountant"
+            )
+
+            PayoutRequest.objects.bulk_create(requests, batch_size=10000)
+
+            # Opening balances are the earnings before any payout; processed payouts are debited after them
+            entries = [
+                LedgerEntry(employee=employee, kind=LedgerEntry.ADJUSTMENT, amount=opening)
+                for employee, opening in zip(employees, balances)
+                if opening
+            ]
+            entries.extend(
+                LedgerEntry(employee=request.employee, kind=LedgerEntry.PAYOUT, amount=-request.amount,
+                            payout_request_id=request.pk)
+                for request in requests
+                if request.status == 'Processed'
+            )
+            LedgerEntry.objects.bulk_create(entries, batch_size=10000)
+
+        return len(employees), len(requests)
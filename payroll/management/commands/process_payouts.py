@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from payroll.payouts import process_payout_requests
+
+
+class Command(BaseCommand):
+    help = 'Process pending payout requests in bulk.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('ids', nargs='*', type=int, help='Ids of the payout requests to process.')
+        parser.add_argument('--all', action='store_true', help='Process every pending payout request.')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Requests handled per transaction.')
+
+    def handle(self, *args, **options):
+        if options['all'] == bool(options['ids']):
+            raise CommandError("Pass either payout request ids or --all.")
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be positive.")
+
+        result = process_payout_requests(
+            None if options['all'] else options['ids'],
+            chunk_size=options['chunk_size'],
+        )
+
+        for pk, reason in sorted(result.failed.items()):
+            self.stderr.write(f"Payout request {pk}: {reason}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {len(result.processed)} payout request(s), {len(result.failed)} failed."
+        ))
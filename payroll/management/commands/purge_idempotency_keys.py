@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+from payroll.payouts import purge_idempotency_keys
+
+
+class Command(BaseCommand):
+    help = "Delete payout idempotency keys older than PAYROLL_IDEMPOTENCY_KEY_TTL."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help='Keys deleted per DELETE.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be positive.")
+
+        deleted = purge_idempotency_keys(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired idempotency key(s)."))
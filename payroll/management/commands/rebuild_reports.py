@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from payroll.reports import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute the payout report summary from every live and archived payout request."
+
+    def handle(self, *args, **options):
+        written = rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the payout reports: {written} summary row(s)."))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from payroll.payouts import reconcile_pending_totals
+
+
+class Command(BaseCommand):
+    help = "Recompute employees' pending payout totals and repair any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help='Employees repaired per UPDATE.')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many employees drifted.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be positive.")
+
+        drifted = reconcile_pending_totals(batch_size=options['batch_size'], dry_run=options['dry_run'])
+
+        if options['dry_run']:
+            self.stdout.write(f"{drifted} employee(s) have drifted pending totals.")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Repaired pending totals of {drifted} employee(s)."))
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from payroll.reports import refresh
+
+
+class Command(BaseCommand):
+    help = "Fold recorded payout changes into the payout report summary."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help='Changes folded per transaction.')
+        parser.add_argument('--interval', type=float, help='Keep running, refreshing every this many seconds.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or (options['interval'] is not None and options['interval'] <= 0):
+            raise CommandError("--batch-size and --interval must be positive.")
+
+        while True:
+            folded = refresh(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"Folded {folded} payout change(s) into the reports."))
+            if options['interval'] is None:
+                return
+            close_old_connections()
+            time.sleep(options['interval'])
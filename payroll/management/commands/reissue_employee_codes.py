@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from payroll.codes import reissue_codes
+
+
+class Command(BaseCommand):
+    help = "Give employees whose code predates the configured generator a new code."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--include-unregistered', action='store_true',
+            help='Also convert employees who have not registered yet (their old code stops working).',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='Employees updated per transaction.')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the codes that would change.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be positive.")
+
+        count = reissue_codes(
+            include_unregistered=options['include_unregistered'],
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+        verb = "Would reissue" if options['dry_run'] else "Reissued"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {count} employee code(s)."))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from payroll.accrual import previous_month, run_accrual
+
+
+def parse_period(value):
+    try:
+        year, month = (int(part) for part in value.split('-'))
+    except ValueError:
+        raise CommandError(f"Invalid period {value!r}; expected YYYY-MM.")
+    if not 1 <= month <= 12:
+        raise CommandError(f"Invalid period {value!r}; expected YYYY-MM.")
+    return year, month
+
+
+class Command(BaseCommand):
+    help = "Credit one month of salary to every active employee's available earnings."
+
+    def add_arguments(self, parser):
+        parser.add_argument('period', nargs='?', help='Pay period as YYYY-MM (default: last month).')
+        parser.add_argument('--dry-run', action='store_true', help='Compute the totals without crediting anyone.')
+
+    def handle(self, *args, **options):
+        year, month = parse_period(options['period']) if options['period'] else previous_month()
+
+        result = run_accrual(year, month, dry_run=options['dry_run'])
+        run = result.run
+
+        if not result.created:
+            self.stdout.write(self.style.WARNING(
+                f"Payroll for {year}-{month:02d} was already run on {run.created_at:%Y-%m-%d %H:%M}; nothing to do."
+            ))
+        elif options['dry_run']:
+            self.stdout.write(
+                f"Dry run for {year}-{month:02d}: would credit {run.total_credited} USD "
+                f"to {run.employees_credited} employee(s)."
+            )
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Credited {run.total_credited} USD to {run.employees_credited} employee(s) for {year}-{month:02d}."
+            ))
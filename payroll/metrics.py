@@ -0,0 +1,288 @@
+"""
+Prometheus-style metrics, served as text at `/metrics`.
+
+Counters and histograms live in a dict in each process; an update takes one short
+lock around a dict increment, so they stay on in the hot paths. Gauges (pending
+requests and amount, queued payout jobs) are read from the database when scraped.
+
+Under several worker processes (e.g. gunicorn) set PAYROLL_METRICS_DIR: every
+process then also writes its values to its own file in that directory, at most once
+per PAYROLL_METRICS_FLUSH_INTERVAL seconds, and a scrape adds up the files of all
+processes, including ones that have exited, so totals survive worker restarts. Empty
+the directory when the service is (re)deployed.
+"""
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .profiling import view_name
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Method label values; any other method a client sends is counted as "other", so it cannot add series
+HTTP_METHODS = frozenset({'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS', 'TRACE', 'CONNECT'})
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+# Held while this process writes its file; a thread that finds it taken skips its flush
+_flush_lock = threading.Lock()
+# (metric name, label values) -> float for counters, [bucket counts..., sum, count] for histograms
+_values = {}
+_registry = {}
+_process_id = uuid.uuid4().hex
+_last_flush = 0.0
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _registry[name] = self
+
+    def _key(self, labels):
+        return self.name, tuple(str(labels[label]) for label in self.labelnames)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            _values[key] = _values.get(key, 0) + amount
+        _maybe_flush()
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        # Index of the first bucket the value fits in; counts are made cumulative on output
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with _lock:
+            series = _values.get(key)
+            if series is None:
+                series = _values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+        _maybe_flush()
+
+
+PAYOUT_REQUESTS_CREATED = Counter(
+    'payroll_payout_requests_created_total', "Payout requests submitted.",
+)
+PAYOUT_REQUESTS_REJECTED = Counter(
+    'payroll_payout_requests_rejected_total', "Payout submissions refused, by reason.", ['reason'],
+)
+PAYOUT_REQUESTS_PROCESSED = Counter(
+    'payroll_payout_requests_processed_total', "Payout requests paid out.",
+)
+PAYOUT_FAILURES = Counter(
+    'payroll_payout_failures_total', "Payout requests that could not be processed, by reason.", ['reason'],
+)
+PAYOUT_PROCESSING_SECONDS = Histogram(
+    'payroll_payout_processing_seconds',
+    "Time to process one payout request (mode=single) or one batch (mode=batch).", ['mode'],
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    'payroll_http_request_duration_seconds', "Request latency by view.", ['view', 'method', 'status'],
+)
+
+
+def _directory():
+    return getattr(settings, 'PAYROLL_METRICS_DIR', '')
+
+
+def _snapshot():
+    with _lock:
+        return {key: list(value) if isinstance(value, list) else value for key, value in _values.items()}
+
+
+def flush():
+    """
+    Write this process's values to its file in PAYROLL_METRICS_DIR.
+
+    Skipped while another thread of the process is writing it. Errors are logged, never
+    raised, so a metric update cannot fail the payout that made it.
+    """
+    global _last_flush
+    directory = _directory()
+    if not directory or not _flush_lock.acquire(blocking=False):
+        return
+    try:
+        _last_flush = time.monotonic()
+        path = os.path.join(directory, f'{_process_id}.json')
+        temporary = f'{path}.{threading.get_ident()}.tmp'
+        os.makedirs(directory, exist_ok=True)
+        with open(temporary, 'w') as output:
+            json.dump([[name, list(labels), value] for (name, labels), value in _snapshot().items()], output)
+        os.replace(temporary, path)
+    except OSError:
+        logger.exception("Could not write metrics to %s", directory)
+    finally:
+        _flush_lock.release()
+
+
+def _maybe_flush():
+    if _directory() and time.monotonic() - _last_flush >= getattr(settings, 'PAYROLL_METRICS_FLUSH_INTERVAL', 1.0):
+        flush()
+
+
+def _after_fork():
+    # A forked worker starts from zero with a file of its own
+    global _process_id, _last_flush, _flush_lock
+    _values.clear()
+    # A thread of the parent may have been holding it
+    _flush_lock = threading.Lock()
+    _process_id = uuid.uuid4().hex
+    _last_flush = 0.0
+
+
+os.register_at_fork(after_in_child=_after_fork)
+atexit.register(lambda: _directory() and flush())
+
+
+def collect():
+    """
+    Values of every process (or only this one, without PAYROLL_METRICS_DIR).
+    """
+    directory = _directory()
+    if not directory:
+        return _snapshot()
+
+    flush()
+    totals = {}
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        try:
+            with open(path) as source:
+                series = json.load(source)
+        except (OSError, ValueError):
+            continue  # Vanished or being replaced; it is read again on the next scrape
+        for name, labels, value in series:
+            key = (name, tuple(labels))
+            if isinstance(value, list):
+                current = totals.setdefault(key, [0] * len(value))
+                totals[key] = [a + b for a, b in zip(current, value)]
+            else:
+                totals[key] = totals.get(key, 0) + value
+    return totals
+
+
+def gauges():
+    """
+    (name, documentation, value) of the figures read from the database at scrape time.
+    """
+    # payroll.models records metrics itself, so it is imported here rather than at the top
+    from django.db.models import Count, Sum
+    from .models import PayoutJob, PayoutRequest
+
+    # Reads only the pending entries of the (status, amount, id) index, not every employee
+    pending = PayoutRequest.objects.filter(status='Pending').aggregate(count=Count('pk'), amount=Sum('amount'))
+    return [
+        ('payroll_pending_payout_requests', "Payout requests waiting to be processed.", pending['count'] or 0),
+        ('payroll_pending_payout_amount', "Total amount of pending payout requests.", pending['amount'] or 0),
+        ('payroll_queued_payout_jobs', "Payout jobs waiting for a worker.",
+         PayoutJob.objects.filter(status=PayoutJob.QUEUED).count()),
+    ]
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def render():
+    """
+    All metrics in the Prometheus text exposition format.
+    """
+    values = collect()
+    lines = []
+    for name, metric in sorted(_registry.items()):
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        for (series_name, label_values), value in sorted(values.items()):
+            if series_name != name:
+                continue
+            pairs = list(zip(metric.labelnames, label_values))
+            if metric.kind == 'counter':
+                lines.append(f'{name}{_labels(pairs)} {_number(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.buckets + ('+Inf',), value[:-2]):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(pairs + [("le", str(bound))])} {cumulative}')
+            lines.append(f'{name}_sum{_labels(pairs)} {_number(value[-2])}')
+            lines.append(f'{name}_count{_labels(pairs)} {value[-1]}')
+    for name, documentation, value in gauges():
+        lines += [f'# HELP {name} {documentation}', f'# TYPE {name} gauge', f'{name} {_number(value)}']
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    with _lock:
+        _values.clear()
+
+
+class MetricsMiddleware:
+    """
+    Records the latency of every request by view name, method and status class.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PAYROLL_METRICS', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        self.observe(request, response, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self.observe(request, response, time.perf_counter() - start)
+        return response
+
+    def observe(self, request, response, seconds):
+        HTTP_REQUEST_SECONDS.observe(
+            seconds, view=view_name(request), method=request.method if request.method in HTTP_METHODS else 'other',
+            status=f'{response.status_code // 100}xx',
+        )
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payroll', '0006_delete_payouthistory'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='payoutrequest',
+            name='employee',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payout_requests', to='payroll.employee'),
+        ),
+        migrations.AddIndex(
+            model_name='payoutrequest',
+            index=models.Index(fields=['status', 'requested_at', 'id'], name='payout_status_requested_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payoutrequest',
+            index=models.Index(fields=['status', 'amount', 'id'], name='payout_status_amount_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payoutrequest',
+            index=models.Index(fields=['employee', 'status', 'requested_at', 'id'], name='payout_emp_status_req_idx'),
+        ),
+    ]
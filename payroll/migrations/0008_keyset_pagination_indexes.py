@@ -0,0 +1,17 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payroll', '0007_payoutrequest_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['salary_rate', 'id'], name='employee_salary_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:04
+
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_pending_totals(apps, schema_editor):
+    Employee = apps.get_model('payroll', 'Employee')
+    PayoutRequest = apps.get_model('payroll', 'PayoutRequest')
+    pending = (
+        PayoutRequest.objects.filter(employee=OuterRef('pk'), status='Pending')
+        .order_by()
+        .values('employee')
+    )
+    Employee.objects.update(
+        pending_total=Coalesce(
+            Subquery(pending.annotate(total=Sum('amount')).values('total')),
+            Value(0),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+        pending_count=Coalesce(Subquery(pending.annotate(count=Count('pk')).values('count')), Value(0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payroll', '0008_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employee',
+            name='pending_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of pending payout requests'),
+        ),
+        migrations.AddField(
+            model_name='employee',
+            name='pending_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, help_text='Sum of pending payout requests', max_digits=12),
+        ),
+        migrations.RunPython(backfill_pending_totals, migrations.RunPython.noop),
+    ]
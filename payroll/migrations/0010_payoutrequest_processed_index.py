@@ -0,0 +1,17 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payroll', '0009_employee_pending_totals'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payoutrequest',
+            index=models.Index(fields=['status', 'processed_at', 'id'], name='payout_status_processed_idx'),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def open_ledger(apps, schema_editor):
+    # Carry each stored balance over as an opening adjustment entry
+    Employee = apps.get_model('payroll', 'Employee')
+    LedgerEntry = apps.get_model('payroll', 'LedgerEntry')
+    rows = Employee.objects.exclude(available_earnings=0).values_list('pk', 'available_earnings').iterator(chunk_size=5000)
+    LedgerEntry.objects.bulk_create(
+        (LedgerEntry(employee_id=pk, kind='Adjustment', amount=amount) for pk, amount in rows),
+        batch_size=5000,
+    )
+
+
+def restore_available_earnings(apps, schema_editor):
+    Employee = apps.get_model('payroll', 'Employee')
+    LedgerEntry = apps.get_model('payroll', 'LedgerEntry')
+    total = (
+        LedgerEntry.objects.filter(employee=OuterRef('pk'))
+        .order_by()
+        .values('employee')
+        .annotate(total=Sum('amount'))
+        .values('total')
+    )
+    Employee.objects.update(
+        available_earnings=Coalesce(
+            Subquery(total), Value(0), output_field=DecimalField(max_digits=10, decimal_places=2),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payroll', '0011_payrollrun'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('last_entry_id', models.BigIntegerField(help_text='Entries with ids up to this one are included')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_snapshots', to='payroll.employee')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('employee', 'last_entry_id'), name='unique_snapshot_per_entry')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('Accrual', 'Accrual'), ('Payout', 'Payout'), ('Adjustment', 'Adjustment')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='payroll.employee')),
+                ('payout_request', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='payroll.payoutrequest')),
+                ('payroll_run', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='entries', to='payroll.payrollrun')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['employee', 'id'], name='ledger_employee_idx')],
+            },
+        ),
+        migrations.RunPython(open_ledger, restore_available_earnings),
+        migrations.RemoveField(
+            model_name='employee',
+            name='available_earnings',
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:24
+
+from django.db import migrations, models
+
+
+def create_employee_code_sequence(apps, schema_editor):
+    # Existing codes are random hex and never clash with the new P-prefixed ones
+    CodeSequence = apps.get_model('payroll', 'CodeSequence')
+    CodeSequence.objects.get_or_create(name='employee_code')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payroll', '0014_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CodeSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('next_value', models.PositiveBigIntegerField(default=1)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='employee',
+            name='employee_code',
+            field=models.CharField(blank=True, max_length=10, unique=True),
+        ),
+        migrations.RunPython(create_employee_code_sequence, migrations.RunPython.noop),
+    ]
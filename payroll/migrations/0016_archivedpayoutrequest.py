@@ -0,0 +1,28 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payroll', '0015_codesequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedPayoutRequest',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('requested_at', models.DateTimeField()),
+                ('processed_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_payout_requests', to='payroll.employee')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['requested_at', 'id'], name='archived_requested_idx'), models.Index(fields=['amount', 'id'], name='archived_amount_idx'), models.Index(fields=['employee', 'requested_at', 'id'], name='archived_emp_requested_idx'), models.Index(fields=['processed_at', 'id'], name='archived_processed_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payroll', '0016_archivedpayoutrequest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PayoutSummaryChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('position', models.CharField(max_length=100)),
+                ('status', models.CharField(choices=[('Pending', 'Pending'), ('Processed', 'Processed')], max_length=20)),
+                ('request_count', models.IntegerField()),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PayoutSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('position', models.CharField(max_length=100)),
+                ('status', models.CharField(choices=[('Pending', 'Pending'), ('Processed', 'Processed')], max_length=20)),
+                ('request_count', models.BigIntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('month', 'position', 'status'), name='unique_payout_summary')],
+            },
+        ),
+    ]
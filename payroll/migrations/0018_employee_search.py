@@ -0,0 +1,62 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:51
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+def _normalize(text):
+    # Frozen copy of payroll.search.normalize
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ' '.join(''.join(char for char in decomposed if not unicodedata.combining(char)).casefold().split())
+
+
+def fill_search_keys(apps, schema_editor):
+    Employee = apps.get_model('payroll', 'Employee')
+    batch = []
+    for employee in Employee.objects.only('first_name', 'last_name').iterator(chunk_size=2000):
+        first, last = _normalize(employee.first_name), _normalize(employee.last_name)
+        employee.search_last_first = f'{last} {first}'.strip()[:150]
+        employee.search_first_last = f'{first} {last}'.strip()[:150]
+        batch.append(employee)
+        if len(batch) == 2000:
+            Employee.objects.bulk_update(batch, ['search_last_first', 'search_first_last'])
+            batch = []
+    Employee.objects.bulk_update(batch, ['search_last_first', 'search_first_last'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payroll', '0017_payoutsummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employee',
+            name='search_first_last',
+            field=models.CharField(default='', editable=False, max_length=150),
+        ),
+        migrations.AddField(
+            model_name='employee',
+            name='search_last_first',
+            field=models.CharField(default='', editable=False, max_length=150),
+        ),
+        migrations.RunPython(fill_search_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['position', 'salary_rate', 'id'], name='employee_position_salary_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['hire_date'], name='employee_hire_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['search_last_first'], name='employee_search_lf_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['search_first_last'], name='employee_search_fl_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
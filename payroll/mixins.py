@@ -1,6 +1,7 @@
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.shortcuts import redirect
+from .roles import ais_accountant, is_accountant
 
 class AccountantRequiredMixin(LoginRequiredMixin):
     """
@@ -10,8 +11,39 @@ class AccountantRequiredMixin(LoginRequiredMixin):
 
     def dispatch(self, request, *args, **kwargs):
         # Check if the user belongs to the 'Accountant' group
-        if not request.user.groups.filter(name='Accountant').exists():
+        if not is_accountant(request.user):
             messages.error(request, "You are not authorized to view this page.")
             return redirect('profile')  # Redirect to the profile page if unauthorized
 
         return super().dispatch(request, *args, **kwargs)
+
+
+class AsyncLoginRequiredMixin(LoginRequiredMixin):
+    """
+    LoginRequiredMixin for views with async handlers.
+
+    The user is loaded with `request.auser()` rather than through the lazy `request.user`,
+    which may not touch the database from async code, and is stored back on the request
+    so templates and context processors reuse it.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        request.user = await request.auser()
+        if not request.user.is_authenticated:
+            return self.handle_no_permission()
+        # LoginRequiredMixin.dispatch now only sees the loaded user and returns the handler's coroutine
+        return await super().dispatch(request, *args, **kwargs)
+
+
+class AsyncAccountantRequiredMixin(AsyncLoginRequiredMixin):
+    """
+    AccountantRequiredMixin for views with async handlers.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        request.user = await request.auser()
+        if not await ais_accountant(request.user):
+            messages.error(request, "You are not authorized to view this page.")
+            return redirect('profile')
+
+        return await super().dispatch(request, *args, **kwargs)
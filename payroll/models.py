@@ -2,9 +2,16 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Round
+from decimal import Decimal
+import time
 import uuid
 
+from . import metrics
+
 # Utility function
+# Legacy random codes; still referenced by migration 0002. New codes come from payroll.codes
 def generate_employee_code():
     return uuid.uuid4().hex[:10]  # Generate a unique 10-character employee code
 
@@ -36,6 +43,54 @@ class CustomUser(AbstractUser):
     def __str__(self):
         return self.username
 
+BALANCE_FIELD = DecimalField(max_digits=14, decimal_places=2)
+CENTS = Decimal('0.01')
+
+class EmployeeQuerySet(models.QuerySet):
+    def with_balance(self):
+        """
+        Annotate `ledger_balance`: the latest balance snapshot plus the ledger entries after it.
+        """
+        latest_snapshot = BalanceSnapshot.objects.filter(employee=OuterRef('pk')).order_by('-last_entry_id')
+        snapshot_entry_id = Coalesce(
+            Subquery(
+                BalanceSnapshot.objects.filter(employee=OuterRef(OuterRef('pk')))
+                .order_by('-last_entry_id')
+                .values('last_entry_id')[:1]
+            ),
+            Value(0),
+        )
+        delta = (
+            LedgerEntry.objects.filter(employee=OuterRef('pk'), pk__gt=snapshot_entry_id)
+            .order_by()
+            .values('employee')
+            .annotate(total=Sum('amount'))
+            .values('total')
+        )
+        return self.annotate(ledger_balance=Round(
+            Coalesce(Subquery(latest_snapshot.values('balance')[:1]), Value(0), output_field=BALANCE_FIELD)
+            + Coalesce(Subquery(delta), Value(0), output_field=BALANCE_FIELD),
+            2,
+            output_field=BALANCE_FIELD,
+        ))
+
+    def lock(self):
+        """
+        Lock the employee rows, in pk order to avoid deadlocks, in a statement of their own.
+
+        Read balances in a later query: on PostgreSQL a locking statement reads from a
+        snapshot taken before it waited for the lock, so a balance read in the same
+        statement would miss the debit the previous lock holder just committed.
+        """
+        return list(self.select_for_update().order_by('pk').values_list('pk', flat=True))
+
+    def bulk_create(self, objs, *args, **kwargs):
+        # Bulk inserts skip save(), which fills in the search keys
+        objs = list(objs)
+        for obj in objs:
+            obj.set_search_keys()
+        return super().bulk_create(objs, *args, **kwargs)
+
 # Employee model
 class Employee(models.Model):
     first_name = models.CharField(max_length=50)
@@ -44,13 +99,67 @@ class Employee(models.Model):
     salary_rate = models.DecimalField(max_digits=10, decimal_places=2)
     hire_date = models.DateField()
     is_active = models.BooleanField(default=True)
-    available_earnings = models.DecimalField(
-        max_digits=10, decimal_places=2, default=0,
-        help_text="Available balance for withdrawal"
+    # Assigned on save from the configured generator when left blank (see payroll.codes)
+    employee_code = models.CharField(max_length=10, unique=True, blank=True)
+    # Maintained alongside PayoutRequest changes; see `reconcile_pending_totals` to repair drift
+    pending_total = models.DecimalField(
+        max_digits=12, decimal_places=2, default=0, editable=False,
+        help_text="Sum of pending payout requests"
     )
-    employee_code = models.CharField(
-        max_length=10, unique=True, default=generate_employee_code, blank=True
+    pending_count = models.PositiveIntegerField(
+        default=0, editable=False,
+        help_text="Number of pending payout requests"
     )
+    # Normalized "last first" / "first last" names for indexed prefix search (see payroll.search)
+    search_last_first = models.CharField(max_length=150, default='', editable=False)
+    search_first_last = models.CharField(max_length=150, default='', editable=False)
+
+    class Meta:
+        indexes = [
+            # Employee list sorted by salary, keyset-paginated on (salary_rate, id)
+            models.Index(fields=['salary_rate', 'id'], name='employee_salary_idx'),
+            # The same list filtered by position
+            models.Index(fields=['position', 'salary_rate', 'id'], name='employee_position_salary_idx'),
+            models.Index(fields=['hire_date'], name='employee_hire_date_idx'),
+            # Name prefix search; the operator class lets PostgreSQL serve LIKE 'prefix%' (ignored elsewhere)
+            models.Index(fields=['search_last_first'], name='employee_search_lf_idx', opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['search_first_last'], name='employee_search_fl_idx', opclasses=['varchar_pattern_ops']),
+        ]
+
+    objects = EmployeeQuerySet.as_manager()
+
+    @property
+    def available_earnings(self):
+        """
+        Available balance for withdrawal, computed from the earnings ledger.
+        Loaded once per instance unless the queryset used `with_balance()`.
+        """
+        if 'ledger_balance' not in self.__dict__:
+            if self.pk is None:
+                return Decimal(0)
+            self.ledger_balance = (
+                Employee.objects.with_balance().filter(pk=self.pk).values_list('ledger_balance', flat=True).get()
+            )
+        # Computed values come back unscaled on some backends (SQLite returns floats)
+        return self.ledger_balance.quantize(CENTS)
+
+    def refresh_from_db(self, *args, **kwargs):
+        self.__dict__.pop('ledger_balance', None)
+        super().refresh_from_db(*args, **kwargs)
+
+    def set_search_keys(self):
+        from .search import name_keys
+        self.search_last_first, self.search_first_last = name_keys(self.first_name, self.last_name)
+
+    def save(self, *args, **kwargs):
+        if not self.employee_code:
+            from .codes import get_generator
+            self.employee_code = get_generator().generate(1)[0]
+        self.set_search_keys()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'first_name', 'last_name'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'search_last_first', 'search_first_last'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.first_name} {self.last_name} - {self.position}"
@@ -68,21 +177,280 @@ class PayoutRequest(models.Model):
     processed_at = models.DateTimeField(null=True, blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Pending')
 
+    class Meta:
+        indexes = [
+            # Pending / processed lists sorted by date or amount
+            # (`id` is the keyset pagination tie-breaker)
+            models.Index(fields=['status', 'requested_at', 'id'], name='payout_status_requested_idx'),
+            models.Index(fields=['status', 'amount', 'id'], name='payout_status_amount_idx'),
+            # An employee's own payout history
+            models.Index(fields=['employee', 'status', 'requested_at', 'id'], name='payout_emp_status_req_idx'),
+            # Exports by processed date range
+            models.Index(fields=['status', 'processed_at', 'id'], name='payout_status_processed_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding and self.status == 'Pending':
+                Employee.objects.filter(pk=self.employee_id).update(
+                    pending_total=F('pending_total') + self.amount,
+                    pending_count=F('pending_count') + 1,
+                )
+                PayoutSummaryChange.added(
+                    'Pending', self.requested_at, PayoutSummaryChange.position_of(self.employee_id), self.amount,
+                ).save()
+
     def process_request(self):
-        """Processes the payout request and updates employee's available earnings."""
+        """
+        Processes the payout request and debits the employee's earnings ledger.
+
+        The status change is a conditional UPDATE, so a request can never be paid twice.
+        The employee row is then locked while the balance is checked and the debit entry
+        appended, so parallel processors cannot take the balance below zero.
+        """
+        if self.status == 'Processed':
+            metrics.PAYOUT_FAILURES.inc(reason='already_processed')
+            raise ValueError("This payout request has already been processed.")
+
+        start = time.perf_counter()
+        processed_at = timezone.now()
         with transaction.atomic():
-            if self.status == 'Processed':
+            claimed = PayoutRequest.objects.filter(pk=self.pk, status='Pending').update(
+                status='Processed', processed_at=processed_at
+            )
+            if not claimed:
+                metrics.PAYOUT_FAILURES.inc(reason='already_processed')
                 raise ValueError("This payout request has already been processed.")
 
-            if self.amount > self.employee.available_earnings:
+            Employee.objects.filter(pk=self.employee_id).lock()
+            balance, position = (
+                Employee.objects.with_balance().values_list('ledger_balance', 'position').get(pk=self.employee_id)
+            )
+            if self.amount > balance:
+                metrics.PAYOUT_FAILURES.inc(reason='insufficient_funds')
+                # Raising rolls back the status change made above
                 raise ValueError("Insufficient funds for this payout request.")
 
-            self.employee.available_earnings -= self.amount
-            self.employee.save()
+            LedgerEntry.objects.create(
+                employee_id=self.employee_id, kind=LedgerEntry.PAYOUT, amount=-self.amount, payout_request_id=self.pk,
+            )
+            Employee.objects.filter(pk=self.employee_id).update(
+                pending_total=F('pending_total') - self.amount,
+                pending_count=F('pending_count') - 1,
+            )
+            PayoutSummaryChange.objects.bulk_create(
+                PayoutSummaryChange.paid(position, self.amount, self.requested_at, processed_at)
+            )
 
-            self.status = 'Processed'
-            self.processed_at = timezone.now()
-            self.save()
+        metrics.PAYOUT_REQUESTS_PROCESSED.inc()
+        metrics.PAYOUT_PROCESSING_SECONDS.observe(time.perf_counter() - start, mode='single')
+        self.status = 'Processed'
+        self.processed_at = processed_at
+        if PayoutRequest.employee.is_cached(self):
+            self.employee.refresh_from_db(fields=['pending_total', 'pending_count'])
 
     def __str__(self):
         return f"Payout Request by {self.employee} for {self.amount} USD"
+
+# Processed payout requests moved out of PayoutRequest by `archive_payouts` (see payroll/archive.py)
+class ArchivedPayoutRequest(models.Model):
+    # The id the request had in PayoutRequest, so ledger references and page cursors stay valid
+    id = models.BigIntegerField(primary_key=True)
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='archived_payout_requests')
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    requested_at = models.DateTimeField()
+    processed_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    # Archived requests are always processed; mirrors PayoutRequest for code reading both
+    status = 'Processed'
+
+    class Meta:
+        indexes = [
+            # The same history and export orderings as PayoutRequest, without the status prefix
+            models.Index(fields=['requested_at', 'id'], name='archived_requested_idx'),
+            models.Index(fields=['amount', 'id'], name='archived_amount_idx'),
+            models.Index(fields=['employee', 'requested_at', 'id'], name='archived_emp_requested_idx'),
+            models.Index(fields=['processed_at', 'id'], name='archived_processed_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived payout request by {self.employee} for {self.amount} USD"
+
+# Monthly payout totals by position and status, the only table the reports read (see payroll/reports.py).
+# Pending requests count in the month they were requested, processed ones in the month they were paid.
+class PayoutSummary(models.Model):
+    month = models.DateField(help_text="First day of the month")
+    position = models.CharField(max_length=100)
+    status = models.CharField(max_length=20, choices=PayoutRequest.STATUS_CHOICES)
+    request_count = models.BigIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['month', 'position', 'status'], name='unique_payout_summary'),
+        ]
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} {self.position} {self.status}: {self.total_amount} USD"
+
+# Change to the payout totals written with the payout change itself and not yet folded into PayoutSummary
+class PayoutSummaryChange(models.Model):
+    month = models.DateField()
+    position = models.CharField(max_length=100)
+    status = models.CharField(max_length=20, choices=PayoutRequest.STATUS_CHOICES)
+    request_count = models.IntegerField()
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+
+    @staticmethod
+    def month_of(moment):
+        return timezone.localtime(moment).date().replace(day=1)
+
+    @staticmethod
+    def position_of(employee_id):
+        """
+        The employee's position as a subquery, read by the INSERT of the change itself.
+        """
+        return Subquery(Employee.objects.filter(pk=employee_id).values('position')[:1])
+
+    @classmethod
+    def added(cls, status, moment, position, amount):
+        """
+        The change for one request of `amount` now counted under `status` in the month of `moment`.
+        """
+        return cls(month=cls.month_of(moment), position=position, status=status, request_count=1, amount=amount)
+
+    @classmethod
+    def removed(cls, status, moment, position, amount):
+        return cls(month=cls.month_of(moment), position=position, status=status, request_count=-1, amount=-amount)
+
+    @classmethod
+    def paid(cls, position, amount, requested_at, processed_at):
+        """
+        The changes for a pending request that has been processed.
+        """
+        return [
+            cls.removed('Pending', requested_at, position, amount),
+            cls.added('Processed', processed_at, position, amount),
+        ]
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} {self.position} {self.status}: {self.request_count:+d}, {self.amount:+} USD"
+
+# Named counter that hands out blocks of numbers (see payroll.codes)
+class CodeSequence(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    next_value = models.PositiveBigIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.name}: next {self.next_value}"
+
+# Pay period accrual run; one row per period makes accruals idempotent
+class PayrollRun(models.Model):
+    period_start = models.DateField(unique=True)
+    period_end = models.DateField()
+    employees_credited = models.PositiveIntegerField(default=0)
+    total_credited = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Payroll run {self.period_start:%Y-%m}: {self.total_credited} USD to {self.employees_credited} employees"
+
+# Earnings ledger: append-only credits (positive) and debits (negative)
+class LedgerEntry(models.Model):
+    ACCRUAL = 'Accrual'
+    PAYOUT = 'Payout'
+    ADJUSTMENT = 'Adjustment'
+    KIND_CHOICES = [
+        (ACCRUAL, 'Accrual'),
+        (PAYOUT, 'Payout'),
+        (ADJUSTMENT, 'Adjustment'),
+    ]
+
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='ledger_entries')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    # Plain references without database constraints: entries outlive archived requests
+    payout_request = models.ForeignKey(
+        PayoutRequest, null=True, blank=True, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+'
+    )
+    payroll_run = models.ForeignKey(PayrollRun, null=True, blank=True, on_delete=models.PROTECT, related_name='entries')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Balance reads sum an employee's entries after their latest snapshot
+            models.Index(fields=['employee', 'id'], name='ledger_employee_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.amount} USD for employee #{self.employee_id}"
+
+# Employee balance as of a ledger entry; compaction appends these
+class BalanceSnapshot(models.Model):
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='balance_snapshots')
+    balance = models.DecimalField(max_digits=14, decimal_places=2)
+    last_entry_id = models.BigIntegerField(help_text="Entries with ids up to this one are included")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['employee', 'last_entry_id'], name='unique_snapshot_per_entry'),
+        ]
+
+    def __str__(self):
+        return f"Balance of employee #{self.employee_id}: {self.balance} USD"
+
+# Queued payout processing, run by `manage.py payout_worker` (see payroll/jobs.py)
+class PayoutJob(models.Model):
+    QUEUED = 'Queued'
+    RUNNING = 'Running'
+    DONE = 'Done'
+    DEAD = 'Dead'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (DEAD, 'Dead'),
+    ]
+
+    # Null (jobs queued before requests were split into jobs) means every pending request at the time the job runs
+    request_ids = models.JSONField(null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_by = models.ForeignKey(CustomUser, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Workers claim the oldest due job of a status
+            models.Index(fields=['status', 'run_after', 'id'], name='payoutjob_claim_idx'),
+        ]
+
+    def __str__(self):
+        return f"Payout job #{self.pk} ({self.status})"
+
+# Client-supplied key of a payout submission; a retried submission finds the request it created
+class IdempotencyKey(models.Model):
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+')
+    key = models.CharField(max_length=64)
+    payout_request = models.ForeignKey(PayoutRequest, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key_per_user'),
+        ]
+
+    def __str__(self):
+        return f"Idempotency key {self.key} of user #{self.user_id}"
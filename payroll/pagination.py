@@ -0,0 +1,203 @@
+import base64
+import json
+from itertools import chain
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class KeysetPage:
+    """
+    One page of a keyset-paginated list.
+
+    Exposes the same `has_next` / `has_previous` / `has_other_pages` helpers as Django's
+    Page, plus ready-made query strings for the neighbouring pages.
+    """
+
+    def __init__(self, object_list, has_next, has_previous, next_querystring=None, previous_querystring=None):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_querystring = next_querystring
+        self.previous_querystring = previous_querystring
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+
+class KeysetPaginationMixin:
+    """
+    Cursor pagination for ListViews, keyed on the queryset's sort column plus `pk`.
+
+    Every page is fetched with a `WHERE (sort, pk) > (last sort, last pk)` range instead
+    of an OFFSET, so page N costs the same as page 1 when the sort column is indexed.
+    Any other query parameters (`sort_by`, `order`, filters) are preserved in page links.
+    """
+    paginate_by = 50
+    cursor_kwarg = 'cursor'
+
+    def paginate_queryset(self, queryset, page_size):
+        queryset, position = self.keyset_slice(queryset, page_size)
+        return self.keyset_page(list(queryset), page_size, position)
+
+    async def apaginate_queryset(self, queryset, page_size):
+        """
+        paginate_queryset() for async views; the page is read with async iteration.
+        """
+        queryset, position = self.keyset_slice(queryset, page_size)
+        return self.keyset_page([obj async for obj in queryset], page_size, position)
+
+    def keyset_slice(self, queryset, page_size):
+        """
+        The (unevaluated) queryset for the requested page, one row longer than the page
+        to tell whether more rows follow, and the position details keyset_page() needs.
+        """
+        sort_field = self.get_keyset_field(queryset)
+        field_name = sort_field.lstrip('-')
+        descending = sort_field.startswith('-')
+        model_field = queryset.model._meta.get_field(field_name)
+
+        cursor = self.decode_cursor(self.request.GET.get(self.cursor_kwarg), sort_field, model_field)
+        backwards = cursor is not None and cursor['direction'] == 'previous'
+
+        # Walking backwards means reading the opposite order and flipping the rows afterwards
+        reverse = descending != backwards
+        prefix = '-' if reverse else ''
+        queryset = queryset.order_by(f'{prefix}{field_name}', f'{prefix}pk')
+        if cursor is not None:
+            queryset = queryset.filter(self.keyset_filter(field_name, cursor['value'], cursor['pk'], reverse))
+
+        return queryset[:page_size + 1], (sort_field, field_name, cursor is not None, backwards)
+
+    def keyset_page(self, rows, page_size, position):
+        sort_field, field_name, has_cursor, backwards = position
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if backwards:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, has_cursor
+
+        page = KeysetPage(
+            rows,
+            has_next=has_next,
+            has_previous=has_previous,
+            next_querystring=self.page_querystring(sort_field, field_name, rows[-1], 'next') if has_next and rows else None,
+            previous_querystring=self.page_querystring(sort_field, field_name, rows[0], 'previous') if has_previous and rows else None,
+        )
+        return None, page, rows, page.has_other_pages()
+
+    def get_keyset_field(self, queryset):
+        """
+        The leading ORDER BY column of the queryset; `pk` when it is unordered.
+        """
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        return ordering[0] if ordering else 'pk'
+
+    @staticmethod
+    def keyset_filter(field_name, value, pk, reverse):
+        # The leading inclusive bound lets the database seek straight into the index range
+        op = 'lt' if reverse else 'gt'
+        return (
+            Q(**{f'{field_name}__{op}e': value})
+            & (Q(**{f'{field_name}__{op}': value}) | Q(**{f'pk__{op}': pk}))
+        )
+
+    def page_querystring(self, sort_field, field_name, obj, direction):
+        value = getattr(obj, field_name)
+        value = value.isoformat() if hasattr(value, 'isoformat') else str(value)
+        payload = json.dumps({'f': sort_field, 'v': value, 'pk': obj.pk, 'd': direction})
+        params = self.request.GET.copy()
+        params[self.cursor_kwarg] = base64.urlsafe_b64encode(payload.encode()).decode()
+        return params.urlencode()
+
+    @staticmethod
+    def decode_cursor(raw, sort_field, model_field):
+        """
+        Returns the decoded cursor, or None for a missing, malformed or stale cursor
+        (one issued for a different sort order), which restarts from the first page.
+        """
+        if not raw:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(raw.encode()))
+            if payload['f'] != sort_field or payload['d'] not in ('next', 'previous'):
+                return None
+            return {
+                'value': model_field.to_python(payload['v']),
+                'pk': int(payload['pk']),
+                'direction': payload['d'],
+            }
+        except (ValueError, TypeError, KeyError, ValidationError):
+            return None
+
+
+class MultiTableKeysetPaginationMixin(KeysetPaginationMixin):
+    """
+    Keyset pagination over the view's queryset plus those of `get_other_querysets()`,
+    e.g. live and archived rows of the same list. The querysets must share the sort
+    column and never share a pk. Each one is sliced as if it were the only one, which
+    its own index answers, and the page is the first rows of all the slices merged.
+    """
+
+    def get_other_querysets(self):
+        return []
+
+    def paginate_queryset(self, queryset, page_size):
+        slices = [self.keyset_slice(qs, page_size) for qs in [queryset, *self.get_other_querysets()]]
+        return self.merged_page([list(qs) for qs, _ in slices], page_size, slices[0][1])
+
+    async def apaginate_queryset(self, queryset, page_size):
+        slices = [self.keyset_slice(qs, page_size) for qs in [queryset, *self.get_other_querysets()]]
+        return self.merged_page([[obj async for obj in qs] for qs, _ in slices], page_size, slices[0][1])
+
+    def merged_page(self, row_lists, page_size, position):
+        sort_field, field_name, has_cursor, backwards = position
+        # The order the slices were read in (see keyset_slice)
+        reverse = sort_field.startswith('-') != backwards
+        rows = sorted(chain(*row_lists), key=lambda obj: (getattr(obj, field_name), obj.pk), reverse=reverse)
+        return self.keyset_page(rows[:page_size + 1], page_size, position)
+
+
+class AsyncKeysetListMixin:
+    """
+    Async GET handler for keyset-paginated ListViews.
+
+    The queryset, template and context name come from the sync view it is mixed into;
+    only the page itself is read differently, with async iteration. Views whose
+    get_queryset() needs the database should override `aget_queryset`.
+    """
+
+    async def aget_queryset(self):
+        return self.get_queryset()
+
+    async def get(self, request, *args, **kwargs):
+        self.object_list = await self.aget_queryset()
+        paginator, page, rows, is_paginated = await self.apaginate_queryset(
+            self.object_list, self.get_paginate_by(self.object_list)
+        )
+        context = {
+            'paginator': paginator,
+            'page_obj': page,
+            'is_paginated': is_paginated,
+            'object_list': rows,
+            'view': self,
+        }
+        if self.context_object_name:
+            context[self.context_object_name] = rows
+        if self.extra_context is not None:
+            context.update(self.extra_context)
+        return self.render_to_response(context)
@@ -0,0 +1,278 @@
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import (
+    Case, Count, DecimalField, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Coalesce, Round
+from django.utils import timezone
+
+from . import metrics
+from .models import Employee, IdempotencyKey, LedgerEntry, PayoutRequest, PayoutSummaryChange
+
+ALREADY_PROCESSED = "This payout request has already been processed."
+INSUFFICIENT_FUNDS = "Insufficient funds for this payout request."
+NOT_FOUND = "Payout request does not exist."
+EXCEEDS_EARNINGS = "Requested amount exceeds available earnings."
+EXCEEDS_UNREQUESTED = "Requested amount plus your pending requests exceeds available earnings."
+INVALID_KEY = "Idempotency keys are at most 64 characters long."
+
+# Metric labels for the failure and rejection reasons
+REASONS = {
+    ALREADY_PROCESSED: 'already_processed',
+    INSUFFICIENT_FUNDS: 'insufficient_funds',
+    NOT_FOUND: 'not_found',
+    EXCEEDS_EARNINGS: 'exceeds_earnings',
+    EXCEEDS_UNREQUESTED: 'exceeds_unrequested',
+}
+
+
+def idempotency_key_ttl():
+    return timedelta(seconds=settings.PAYROLL_IDEMPOTENCY_KEY_TTL)
+
+
+def _replay(user, idempotency_key):
+    """
+    The request created earlier under this key, or None. An expired key is dropped.
+    """
+    stored = (
+        IdempotencyKey.objects.select_related('payout_request')
+        .filter(user=user, key=idempotency_key).first()
+    )
+    if stored is None:
+        return None
+    if stored.created_at < timezone.now() - idempotency_key_ttl():
+        stored.delete()
+        return None
+    return stored.payout_request
+
+
+def create_pending(employee, amount, user=None, idempotency_key=None):
+    """
+    Create a pending payout request; returns `(payout_request, created)`.
+
+    With an idempotency key (scoped to `user`) a retried submission returns the request
+    created by the first one instead of inserting another. The employee row is locked
+    while the amount is checked against the balance less the requests already pending,
+    so parallel submissions cannot together ask for more than the employee has.
+    Raises ValueError when the amount is not covered.
+    """
+    if idempotency_key is not None and len(idempotency_key) > 64:
+        raise ValueError(INVALID_KEY)
+    keyed = user is not None and bool(idempotency_key)
+
+    try:
+        with transaction.atomic():
+            # The balance and pending total are read after the lock is granted, in a query
+            # of their own, so they include what the previous holder committed
+            Employee.objects.filter(pk=employee.pk).lock()
+            balance, pending_total = (
+                Employee.objects.with_balance().values_list('ledger_balance', 'pending_total').get(pk=employee.pk)
+            )
+            # Checked under the lock: a parallel retry with the same key waits and then finds it
+            if keyed and (existing := _replay(user, idempotency_key)) is not None:
+                return existing, False
+
+            if amount > balance:
+                metrics.PAYOUT_REQUESTS_REJECTED.inc(reason=REASONS[EXCEEDS_EARNINGS])
+                raise ValueError(EXCEEDS_EARNINGS)
+            if amount + pending_total > balance:
+                metrics.PAYOUT_REQUESTS_REJECTED.inc(reason=REASONS[EXCEEDS_UNREQUESTED])
+                raise ValueError(EXCEEDS_UNREQUESTED)
+
+            payout_request = PayoutRequest.objects.create(employee=employee, amount=amount, status='Pending')
+            if keyed:
+                IdempotencyKey.objects.create(user=user, key=idempotency_key, payout_request=payout_request)
+    except IntegrityError:
+        # The same key was stored concurrently (without row locks, e.g. on SQLite)
+        if keyed and (existing := _replay(user, idempotency_key)) is not None:
+            return existing, False
+        raise
+    metrics.PAYOUT_REQUESTS_CREATED.inc()
+    return payout_request, True
+
+
+def purge_idempotency_keys(batch_size=10000):
+    """
+    Delete expired idempotency keys in batches; returns how many were deleted.
+    """
+    cutoff = timezone.now() - idempotency_key_ttl()
+    deleted = 0
+    while True:
+        batch = list(IdempotencyKey.objects.filter(created_at__lt=cutoff).values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(pk__in=batch).delete()[0]
+
+
+@dataclass
+class BatchResult:
+    """
+    Outcome of a batch run: ids of processed requests and a reason for every failed one.
+    """
+    processed: list = field(default_factory=list)
+    failed: dict = field(default_factory=dict)
+
+    def merge(self, other):
+        self.processed.extend(other.processed)
+        self.failed.update(other.failed)
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def process_payout_requests(request_ids=None, chunk_size=1000):
+    """
+    Process many payout requests at once.
+
+    Pass a list of ids to process a selection, or None to process every pending request.
+    Requests are handled in chunks, each chunk in its own transaction: the affected
+    employees are locked once, balances are checked per employee across all of their
+    requests in the chunk (oldest first), the debits are appended to the ledger with one
+    bulk INSERT and the counters and status changes are written with one UPDATE each.
+    """
+    if request_ids is None:
+        request_ids = list(
+            PayoutRequest.objects.filter(status='Pending')
+            .order_by('employee_id', 'requested_at', 'pk')
+            .values_list('pk', flat=True)
+        )
+    else:
+        request_ids = list(dict.fromkeys(int(pk) for pk in request_ids))
+
+    start = time.perf_counter()
+    result = BatchResult()
+    for chunk in _chunks(request_ids, chunk_size):
+        result.merge(_process_chunk(chunk))
+
+    metrics.PAYOUT_PROCESSING_SECONDS.observe(time.perf_counter() - start, mode='batch')
+    metrics.PAYOUT_REQUESTS_PROCESSED.inc(len(result.processed))
+    for reason, count in Counter(result.failed.values()).items():
+        metrics.PAYOUT_FAILURES.inc(count, reason=REASONS[reason])
+    return result
+
+
+def _process_chunk(request_ids):
+    result = BatchResult()
+
+    with transaction.atomic():
+        rows = list(
+            PayoutRequest.objects.select_for_update()
+            .filter(pk__in=request_ids)
+            .order_by('employee_id', 'requested_at', 'pk')
+            .values_list('pk', 'employee_id', 'amount', 'status', 'requested_at')
+        )
+        found = {pk for pk, _, _, _, _ in rows}
+        for pk in request_ids:
+            if pk not in found:
+                result.failed[pk] = NOT_FOUND
+
+        pending = []
+        for pk, employee_id, amount, status, requested_at in rows:
+            if status == 'Processed':
+                result.failed[pk] = ALREADY_PROCESSED
+            else:
+                pending.append((pk, employee_id, amount, requested_at))
+        if not pending:
+            return result
+
+        # Lock every affected employee once, then read their ledger balances (and
+        # positions, for the reports) in a query of its own, which sees every debit
+        # committed before the locks were granted.
+        employee_ids = Employee.objects.filter(pk__in={employee_id for _, employee_id, _, _ in pending}).lock()
+        balances, positions = {}, {}
+        for pk, balance, position in (
+            Employee.objects.with_balance().filter(pk__in=employee_ids).values_list('pk', 'ledger_balance', 'position')
+        ):
+            balances[pk], positions[pk] = balance, position
+
+        processed_at = timezone.now()
+        debits = {}
+        counts = {}
+        entries = []
+        summary_changes = []
+        for pk, employee_id, amount, requested_at in pending:
+            if amount > balances[employee_id]:
+                result.failed[pk] = INSUFFICIENT_FUNDS
+                continue
+            balances[employee_id] -= amount
+            debits[employee_id] = debits.get(employee_id, 0) + amount
+            counts[employee_id] = counts.get(employee_id, 0) + 1
+            entries.append(LedgerEntry(
+                employee_id=employee_id, kind=LedgerEntry.PAYOUT, amount=-amount, payout_request_id=pk,
+            ))
+            summary_changes += PayoutSummaryChange.paid(positions[employee_id], amount, requested_at, processed_at)
+            result.processed.append(pk)
+
+        if not debits:
+            return result
+
+        LedgerEntry.objects.bulk_create(entries)
+        Employee.objects.filter(pk__in=debits).update(
+            pending_total=F('pending_total') - Case(
+                *[When(pk=employee_id, then=Value(total)) for employee_id, total in debits.items()],
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+            pending_count=F('pending_count') - Case(
+                *[When(pk=employee_id, then=Value(count)) for employee_id, count in counts.items()],
+                output_field=IntegerField(),
+            ),
+        )
+        PayoutRequest.objects.filter(pk__in=result.processed).update(
+            status='Processed',
+            processed_at=processed_at,
+        )
+        PayoutSummaryChange.objects.bulk_create(summary_changes)
+
+    return result
+
+
+def pending_totals_subqueries():
+    """
+    Correlated subqueries computing an employee's real pending sum and count.
+    """
+    pending = (
+        PayoutRequest.objects.filter(employee=OuterRef('pk'), status='Pending')
+        .order_by()
+        .values('employee')
+    )
+    total = Round(
+        Coalesce(
+            Subquery(pending.annotate(total=Sum('amount')).values('total')),
+            Value(0),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+        2,
+    )
+    count = Coalesce(Subquery(pending.annotate(count=Count('pk')).values('count')), Value(0))
+    return total, count
+
+
+def reconcile_pending_totals(batch_size=10000, dry_run=False):
+    """
+    Recompute `Employee.pending_total` / `pending_count` and fix the rows that drifted.
+
+    Drifted employees are found with one scan and repaired in batches with a single
+    set-based UPDATE each. Returns the number of employees that were out of sync.
+    """
+    total, count = pending_totals_subqueries()
+    drifted = list(
+        # Rounding both sides keeps SQLite's floating point sums from looking like drift
+        Employee.objects.alias(stored_total=Round('pending_total', 2), actual_total=total, actual_count=count)
+        .filter(~Q(stored_total=F('actual_total')) | ~Q(pending_count=F('actual_count')))
+        .order_by('pk')
+        .values_list('pk', flat=True)
+    )
+    if not dry_run:
+        for start in range(0, len(drifted), batch_size):
+            with transaction.atomic():
+                Employee.objects.filter(pk__in=drifted[start:start + batch_size]).update(
+                    pending_total=total, pending_count=count,
+                )
+    return len(drifted)
@@ -0,0 +1,256 @@
+"""
+Opt-in request profiling (PAYROLL_PROFILING).
+
+`ProfilingMiddleware` measures every request: wall time, the SQL queries run (count,
+total time, exact duplicates and "similar" queries, i.e. the same SQL with different
+parameters, the usual sign of an N+1), and the time spent rendering the template of a
+TemplateResponse. Queries are recorded by a database execute wrapper that reports to
+the profile of the request in the current context, so async views (whose queries run
+in worker threads) are covered too. SQL run while the template renders counts towards
+both the SQL and the template figures.
+
+Each response gets the figures in an `X-Payroll-Profile` header (and the timings in
+a `Server-Timing` header, shown by browser developer tools), the latest PAYROLL_PROFILING_WINDOW
+requests of every view are kept for `summary()` (served as JSON to staff at
+`/profiling/`), and with PAYROLL_PROFILING_SAMPLE_RATE a share of the synchronous
+requests is run under cProfile and dumped to PAYROLL_PROFILING_DIR.
+"""
+import cProfile
+import logging
+import os
+import random
+import statistics
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('payroll_request_profile', default=None)
+
+
+@dataclass
+class RequestProfile:
+    queries: list = field(default_factory=list)  # (sql, params, seconds)
+    template_seconds: float = 0.0
+    wall_seconds: float = 0.0
+
+    @property
+    def sql_seconds(self):
+        return sum(seconds for _, _, seconds in self.queries)
+
+    @property
+    def duplicated(self):
+        """
+        Queries that repeat an earlier query with the same parameters.
+        """
+        counts = Counter((sql, params) for sql, params, _ in self.queries)
+        return sum(count - 1 for count in counts.values())
+
+    @property
+    def similar(self):
+        """
+        Queries that repeat an earlier query's SQL, whatever the parameters.
+        """
+        counts = Counter(sql for sql, _, _ in self.queries)
+        return sum(count - 1 for count in counts.values())
+
+    def server_timing(self):
+        return ', '.join([
+            f'total;dur={self.wall_seconds * 1000:.1f}',
+            f'sql;dur={self.sql_seconds * 1000:.1f};desc="{len(self.queries)} queries"',
+            f'template;dur={self.template_seconds * 1000:.1f}',
+        ])
+
+    def header(self):
+        return '; '.join([
+            f'wall_ms={self.wall_seconds * 1000:.2f}',
+            f'queries={len(self.queries)}',
+            f'sql_ms={self.sql_seconds * 1000:.2f}',
+            f'duplicated={self.duplicated}',
+            f'similar={self.similar}',
+            f'template_ms={self.template_seconds * 1000:.2f}',
+        ])
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper adding the query to the current request's profile.
+    """
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.queries.append((sql, repr(params), time.perf_counter() - start))
+
+
+def install_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+# Rolling per-view statistics
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def record(view_name, profile):
+    window = getattr(settings, 'PAYROLL_PROFILING_WINDOW', 500)
+    sample = (
+        profile.wall_seconds, len(profile.queries), profile.sql_seconds,
+        profile.duplicated, profile.similar, profile.template_seconds,
+    )
+    with _stats_lock:
+        total, samples = _stats.get(view_name, (0, None))
+        if samples is None or samples.maxlen != window:
+            samples = deque(samples or (), maxlen=window)
+        samples.append(sample)
+        _stats[view_name] = (total + 1, samples)
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summary():
+    """
+    {view name: figures} over the latest requests of each view; times in milliseconds.
+    """
+    with _stats_lock:
+        snapshot = {name: (total, list(samples)) for name, (total, samples) in _stats.items()}
+
+    result = {}
+    for name, (total, samples) in sorted(snapshot.items()):
+        wall, queries, sql, duplicated, similar, template = zip(*samples)
+        result[name] = {
+            'requests': total,
+            'window': len(samples),
+            'wall_ms': {
+                'p50': round(_percentile(wall, 0.5) * 1000, 2),
+                'p95': round(_percentile(wall, 0.95) * 1000, 2),
+                'max': round(max(wall) * 1000, 2),
+            },
+            'queries': {'mean': round(statistics.fmean(queries), 2), 'max': max(queries)},
+            'sql_ms_mean': round(statistics.fmean(sql) * 1000, 2),
+            'duplicated_max': max(duplicated),
+            'similar_max': max(similar),
+            'template_ms_mean': round(statistics.fmean(template) * 1000, 2),
+        }
+    return result
+
+
+def reset():
+    with _stats_lock:
+        _stats.clear()
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return '<unresolved>'
+    return match.view_name or match._func_path
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PAYROLL_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        # Normally already done by PayrollConfig.ready()
+        connection_created.connect(install_query_recorder)
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        profile = RequestProfile()
+        token = _current.set(profile)
+        profiler = self.sampled_profiler()
+        start = time.perf_counter()
+        try:
+            if profiler is None:
+                response = self.get_response(request)
+            else:
+                response = profiler.runcall(self.get_response, request)
+        finally:
+            _current.reset(token)
+        profile.wall_seconds = time.perf_counter() - start
+        if profiler is not None:
+            self.dump(profiler, request)
+        return self.finish(request, response, profile)
+
+    async def __acall__(self, request):
+        profile = RequestProfile()
+        token = _current.set(profile)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        profile.wall_seconds = time.perf_counter() - start
+        return self.finish(request, response, profile)
+
+    def process_template_response(self, request, response):
+        """
+        Time the rendering, which the handler runs after this hook.
+        """
+        profile = _current.get()
+        if profile is None:
+            return response
+        render = response.render
+
+        def timed_render():
+            start = time.perf_counter()
+            try:
+                return render()
+            finally:
+                profile.template_seconds += time.perf_counter() - start
+
+        response.render = timed_render
+        return response
+
+    def finish(self, request, response, profile):
+        name = view_name(request)
+        record(name, profile)
+        response['Server-Timing'] = profile.server_timing()
+        response['X-Payroll-Profile'] = profile.header()
+        logger.debug(
+            "%s %s [%s] %.1fms, %d queries (%.1fms), %d duplicated, %d similar, template %.1fms",
+            request.method, request.path, name, profile.wall_seconds * 1000, len(profile.queries),
+            profile.sql_seconds * 1000, profile.duplicated, profile.similar, profile.template_seconds * 1000,
+        )
+        return response
+
+    def sampled_profiler(self):
+        rate = getattr(settings, 'PAYROLL_PROFILING_SAMPLE_RATE', 0.0)
+        if rate <= 0 or random.random() >= rate:
+            return None
+        return cProfile.Profile()
+
+    def dump(self, profiler, request):
+        directory = getattr(settings, 'PAYROLL_PROFILING_DIR', '') or os.path.join(settings.BASE_DIR, 'profiles')
+        os.makedirs(directory, exist_ok=True)
+        name = view_name(request).replace(':', '-').replace('/', '-')
+        path = os.path.join(directory, f'{name}-{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}-{random.randrange(10 ** 6):06d}.prof')
+        profiler.dump_stats(path)
+        logger.info("Profile of %s %s written to %s", request.method, request.path, path)
@@ -0,0 +1,194 @@
+"""
+Payout reports: totals by month, position and status.
+
+The reports read only PayoutSummary, a few rows per month, so they cost the same
+however many payout requests there are. The summary is kept current incrementally:
+every payout change (a request submitted, processed or withdrawn) appends a
+PayoutSummaryChange row in its own transaction, which is a plain INSERT that never
+contends with other payouts, and `refresh` folds the waiting changes into the summary
+in batches (`manage.py refresh_reports`, run every minute or so). `rebuild` recomputes
+the summary from every live and archived request, for backfills and after bulk loads
+or manual edits that bypass the models (`manage.py rebuild_reports`).
+
+Positions are those of the employees when the change was recorded (or, for `rebuild`,
+their current ones). Processed requests removed with their employee stay in the
+totals until the next rebuild.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connections, router, transaction
+from django.db.models import Count, DateField, Max, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from . import archive
+from .models import CENTS, PayoutRequest, PayoutSummary, PayoutSummaryChange
+
+SUMMARY_KEY = ('month', 'position', 'status')
+
+
+def refresh_batch(batch_size=10000):
+    """
+    Fold up to `batch_size` waiting changes into PayoutSummary in one transaction;
+    returns how many were folded.
+    """
+    with transaction.atomic():
+        # Concurrent refreshes wait for each other here and then skip the folded rows
+        changes = list(
+            PayoutSummaryChange.objects.select_for_update().order_by('pk')
+            .values_list('pk', *SUMMARY_KEY, 'request_count', 'amount')[:batch_size]
+        )
+        if not changes:
+            return 0
+
+        deltas = defaultdict(lambda: [0, Decimal(0)])
+        for _, month, position, status, count, amount in changes:
+            deltas[month, position, status][0] += count
+            deltas[month, position, status][1] += amount
+
+        existing = {
+            (summary.month, summary.position, summary.status): summary
+            for summary in PayoutSummary.objects.select_for_update().filter(month__in={key[0] for key in deltas})
+        }
+        now = timezone.now()
+        created, updated = [], []
+        for key, (count, amount) in deltas.items():
+            summary = existing.get(key)
+            if summary is None:
+                created.append(PayoutSummary(**dict(zip(SUMMARY_KEY, key)), request_count=count, total_amount=amount))
+            else:
+                summary.request_count += count
+                summary.total_amount += amount
+                summary.updated_at = now
+                updated.append(summary)
+        PayoutSummary.objects.bulk_create(created)
+        PayoutSummary.objects.bulk_update(updated, ['request_count', 'total_amount', 'updated_at'])
+        # Only the rows read above: a change committed meanwhile is folded next time
+        PayoutSummaryChange.objects.filter(pk__in=[change[0] for change in changes]).delete()
+    return len(changes)
+
+
+def refresh(batch_size=10000):
+    """
+    Fold every waiting change into PayoutSummary; returns how many were folded.
+    """
+    folded = 0
+    while True:
+        count = refresh_batch(batch_size)
+        folded += count
+        if count < batch_size:
+            return folded
+
+
+def _monthly_totals(queryset, date_field):
+    """
+    (month, position, count, total) of the requests in `queryset`, by the month of `date_field`.
+    """
+    return (
+        queryset.order_by()
+        .values_list(TruncMonth(date_field, output_field=DateField()), 'employee__position')
+        .annotate(count=Count('pk'), total=Sum('amount'))
+    )
+
+
+def rebuild():
+    """
+    Recompute PayoutSummary from all live and archived payout requests; returns the
+    number of summary rows written.
+    """
+    using = router.db_for_write(PayoutSummary)
+    with transaction.atomic(using=using):
+        if connections[using].vendor == 'postgresql':
+            # Payout transactions that have not recorded their change yet wait for the
+            # rebuild and are folded after it, so nothing is counted twice or missed
+            with connections[using].cursor() as cursor:
+                cursor.execute(f'LOCK TABLE {PayoutSummaryChange._meta.db_table} IN SHARE ROW EXCLUSIVE MODE')
+        PayoutSummaryChange.objects.all().delete()
+
+        live, archived = archive.history()
+        totals = defaultdict(lambda: [0, Decimal(0)])
+        for status, queryset in (
+            ('Pending', _monthly_totals(PayoutRequest.objects.filter(status='Pending'), 'requested_at')),
+            ('Processed', _monthly_totals(live, 'processed_at')),
+            ('Processed', _monthly_totals(archived, 'processed_at')),
+        ):
+            for month, position, count, total in queryset:
+                totals[month, position, status][0] += count
+                totals[month, position, status][1] += total
+
+        PayoutSummary.objects.all().delete()
+        PayoutSummary.objects.bulk_create(
+            PayoutSummary(**dict(zip(SUMMARY_KEY, key)), request_count=count, total_amount=Decimal(total).quantize(CENTS))
+            for key, (count, total) in totals.items()
+        )
+    return len(totals)
+
+
+def _average(total, count):
+    return (total / count).quantize(CENTS) if count else None
+
+
+def monthly_report(start=None, end=None, position=None):
+    """
+    Report rows, latest month first: processed count, total and average payout, and
+    pending count and liability per month and position. `start` and `end` are months
+    (first days); both are inclusive.
+    """
+    summaries = PayoutSummary.objects.all()
+    if start is not None:
+        summaries = summaries.filter(month__gte=start)
+    if end is not None:
+        summaries = summaries.filter(month__lte=end)
+    if position:
+        summaries = summaries.filter(position=position)
+
+    rows = {}
+    for month, row_position, status, count, total in summaries.values_list(*SUMMARY_KEY, 'request_count', 'total_amount'):
+        row = rows.setdefault((month, row_position), {
+            'month': month, 'position': row_position,
+            'processed_count': 0, 'processed_total': Decimal('0.00'),
+            'pending_count': 0, 'pending_total': Decimal('0.00'),
+        })
+        prefix = 'processed' if status == 'Processed' else 'pending'
+        row[f'{prefix}_count'] += count
+        row[f'{prefix}_total'] += total
+    for row in rows.values():
+        row['average_payout'] = _average(row['processed_total'], row['processed_count'])
+    return sorted(rows.values(), key=lambda row: (-row['month'].toordinal(), row['position']))
+
+
+def report(start=None, end=None, position=None):
+    """
+    The monthly rows plus their grand totals and the time of the latest refresh.
+    """
+    rows = monthly_report(start, end, position)
+    totals = {
+        name: sum((row[name] for row in rows), Decimal('0.00') if name.endswith('total') else 0)
+        for name in ('processed_count', 'processed_total', 'pending_count', 'pending_total')
+    }
+    totals['average_payout'] = _average(totals['processed_total'], totals['processed_count'])
+    return {
+        'rows': rows,
+        'totals': totals,
+        'updated_at': PayoutSummary.objects.aggregate(latest=Max('updated_at'))['latest'],
+    }
+
+
+def _json_value(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def as_json(data):
+    """
+    `report()` output with JSON-friendly values (ISO dates, amounts as strings).
+    """
+    return {
+        'rows': [{name: _json_value(value) for name, value in row.items()} for row in data['rows']],
+        'totals': {name: _json_value(value) for name, value in data['totals'].items()},
+        'updated_at': _json_value(data['updated_at']),
+    }
@@ -0,0 +1,92 @@
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+
+ACCOUNTANT_GROUP = 'Accountant'
+
+# Process-wide memo of the Accountant group's id; cleared by the Group signal handlers
+_accountant_group_id = None
+
+# Attribute used to memoize the answer on the user object, which lives for one request
+_MEMO_ATTR = '_payroll_is_accountant'
+
+
+def _cache_key(user_id):
+    return f'payroll:is_accountant:{user_id}'
+
+
+def is_accountant(user):
+    """
+    Whether the user belongs to the 'Accountant' group.
+
+    The answer is memoized on the user object, so a request asks the database at most once.
+    When PAYROLL_ROLE_CACHE_TIMEOUT is set it is also kept in Django's cache keyed on the
+    user id; the signal handlers in payroll.signals drop that entry when memberships change.
+    """
+    if not user.is_authenticated:
+        return False
+
+    try:
+        return getattr(user, _MEMO_ATTR)
+    except AttributeError:
+        pass
+
+    timeout = getattr(settings, 'PAYROLL_ROLE_CACHE_TIMEOUT', 0)
+    result = cache.get(_cache_key(user.pk)) if timeout else None
+    if result is None:
+        result = user.groups.filter(name=ACCOUNTANT_GROUP).exists()
+        if timeout:
+            cache.set(_cache_key(user.pk), result, timeout)
+
+    setattr(user, _MEMO_ATTR, result)
+    return result
+
+
+async def ais_accountant(user):
+    """
+    Async version of `is_accountant`, sharing its memo and cache entries.
+    """
+    if not user.is_authenticated:
+        return False
+
+    try:
+        return getattr(user, _MEMO_ATTR)
+    except AttributeError:
+        pass
+
+    timeout = getattr(settings, 'PAYROLL_ROLE_CACHE_TIMEOUT', 0)
+    result = await cache.aget(_cache_key(user.pk)) if timeout else None
+    if result is None:
+        result = await user.groups.filter(name=ACCOUNTANT_GROUP).aexists()
+        if timeout:
+            await cache.aset(_cache_key(user.pk), result, timeout)
+
+    setattr(user, _MEMO_ATTR, result)
+    return result
+
+
+def invalidate_roles(user_ids):
+    """
+    Forget cached role answers for the given user ids.
+    """
+    if getattr(settings, 'PAYROLL_ROLE_CACHE_TIMEOUT', 0):
+        cache.delete_many([_cache_key(user_id) for user_id in user_ids])
+
+
+def forget_memoized_roles(user):
+    user.__dict__.pop(_MEMO_ATTR, None)
+
+
+def accountant_group_id():
+    """
+    Id of the Accountant group, created on first use and then memoized for the process.
+    """
+    global _accountant_group_id
+    if _accountant_group_id is None:
+        _accountant_group_id = Group.objects.get_or_create(name=ACCOUNTANT_GROUP)[0].pk
+    return _accountant_group_id
+
+
+def forget_accountant_group():
+    global _accountant_group_id
+    _accountant_group_id = None
@@ -0,0 +1,115 @@
+"""
+Read-replica routing.
+
+Reads go to a replica (PAYROLL_REPLICA_DATABASES) only while a request handled by a view
+with `read_replica = True` is running, and only for GET/HEAD. Everything else stays on
+the primary (`default`): writes, reads inside a transaction on the primary (so
+`process_request` and friends never see replica data), requests outside the web layer
+(commands, the payout worker) and every read in a request after its first write.
+
+A write also sets a short-lived cookie (PAYROLL_REPLICA_PIN_SECONDS) that keeps the
+client's next requests on the primary, so a user sees their own change straight away
+even when the replicas lag behind.
+"""
+import random
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+PIN_COOKIE = 'payroll_primary'
+
+_state = ContextVar('payroll_routing_state', default=None)
+
+
+@dataclass
+class RoutingState:
+    replica_reads: bool = False
+    pinned: bool = False
+    wrote: bool = False
+
+
+def replicas():
+    return getattr(settings, 'PAYROLL_REPLICA_DATABASES', [])
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.replica_reads or state.pinned or not replicas():
+            return DEFAULT_DB_ALIAS
+        if transaction.get_connection(DEFAULT_DB_ALIAS).in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas())
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            # The rest of this request, and the client's next few, read what was just written
+            state.pinned = state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary through replication
+        return db == DEFAULT_DB_ALIAS
+
+
+def bind(queryset):
+    """
+    The queryset tied to the database the router picks now, for querysets evaluated
+    after the view has returned (e.g. by a StreamingHttpResponse).
+    """
+    return queryset.using(queryset.db)
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Sets up the routing state of each request and keeps clients that wrote on the primary.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state = RoutingState(pinned=PIN_COOKIE in request.COOKIES)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(state, response)
+
+    async def __acall__(self, request):
+        state = RoutingState(pinned=PIN_COOKIE in request.COOKIES)
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(state, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'view_class', None)
+        if request.method in ('GET', 'HEAD') and getattr(view_class, 'read_replica', False):
+            _state.get().replica_reads = True
+
+    def finish(self, state, response):
+        if state.wrote and replicas():
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=getattr(settings, 'PAYROLL_REPLICA_PIN_SECONDS', 5),
+                httponly=True, samesite='Lax',
+            )
+        return response
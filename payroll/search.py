@@ -0,0 +1,103 @@
+"""
+Indexed employee search.
+
+Names are matched by prefix against two normalized columns kept on Employee
+(lower-cased, accents stripped, single spaces): "last first" and "first last", so
+"smi", "smith j", "jo" and "john smith" all find John Smith. Each column has a
+B-tree index, and a prefix match is written so that the index serves it: a range
+(`>= prefix AND < prefix + U+10FFFF`) on SQLite, where LIKE ignores ordinary
+indexes, and `LIKE 'prefix%'` on PostgreSQL, whose indexes use the
+`varchar_pattern_ops` operator class. A search term that is an employee code, as
+typed or upper-cased, also matches that employee through the unique code index.
+
+The matches are looked up first and the rest of the filters and the ordering applied
+to them, so a query planner that would rather walk the ordering index (say, position
+and salary) does not read every row of a position to find a few names. A prefix so
+short that it matches more than BROAD_MATCHES employees is compared on substrings
+instead, which no index serves: the database then walks the ordering index and stops
+as soon as it has a page, rather than sorting most of the table.
+"""
+import unicodedata
+
+from django.db import connections
+from django.db.models import Q
+from django.db.models.functions import Substr
+from django.db.models.lookups import Exact
+
+MAX_KEY_LENGTH = 150
+BROAD_MATCHES = 1000
+
+
+def normalize(text):
+    """
+    `text` lower-cased (case-folded), without accents and with single spaces.
+    """
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(stripped.casefold().split())
+
+
+def name_keys(first_name, last_name):
+    """
+    The ("last first", "first last") search keys of a name.
+    """
+    first, last = normalize(first_name), normalize(last_name)
+    return f'{last} {first}'.strip()[:MAX_KEY_LENGTH], f'{first} {last}'.strip()[:MAX_KEY_LENGTH]
+
+
+def prefix_q(field, prefix, vendor):
+    """
+    A condition matching values of `field` that start with `prefix`, in the form the
+    backend's index on the column can serve.
+    """
+    if vendor == 'postgresql':
+        return Q(**{f'{field}__startswith': prefix})
+    return Q(**{f'{field}__gte': prefix, f'{field}__lt': prefix + '\U0010ffff'})
+
+
+def scan_q(field, prefix):
+    """
+    A condition matching values of `field` that start with `prefix`, which no index
+    serves.
+    """
+    return Q(Exact(Substr(field, 1, len(prefix)), prefix))
+
+
+def search(queryset, term):
+    """
+    Employees in `queryset` whose name starts with `term` (in either name order) or
+    whose employee code is `term`.
+    """
+    key = normalize(term)
+    if not key:
+        return queryset
+    vendor = connections[queryset.db].vendor
+    # Current codes are upper-case; legacy ones (kept by `reissue_codes`) are lower-case hex
+    code = Q(employee_code__in={term.strip(), term.strip().upper()})
+    matches = queryset.model._default_manager.using(queryset.db).filter(
+        prefix_q('search_last_first', key, vendor) | prefix_q('search_first_last', key, vendor) | code
+    ).values('pk')
+    if matches[BROAD_MATCHES:BROAD_MATCHES + 1].exists():
+        return queryset.filter(scan_q('search_last_first', key) | scan_q('search_first_last', key) | code)
+    return queryset.filter(pk__in=matches)
+
+
+def filter_employees(queryset, q='', position='', is_active=None, hired_from=None, hired_to=None,
+                     salary_min=None, salary_max=None):
+    """
+    Apply the employee list's search and filters; empty values are ignored.
+    """
+    queryset = search(queryset, q)
+    if position:
+        queryset = queryset.filter(position=position)
+    if is_active is not None:
+        queryset = queryset.filter(is_active=is_active)
+    if hired_from is not None:
+        queryset = queryset.filter(hire_date__gte=hired_from)
+    if hired_to is not None:
+        queryset = queryset.filter(hire_date__lte=hired_to)
+    if salary_min is not None:
+        queryset = queryset.filter(salary_rate__gte=salary_min)
+    if salary_max is not None:
+        queryset = queryset.filter(salary_rate__lte=salary_max)
+    return queryset
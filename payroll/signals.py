@@ -0,0 +1,53 @@
+from django.contrib.auth.models import Group
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import CustomUser, Employee, PayoutRequest, PayoutSummaryChange
+from .roles import forget_accountant_group, forget_memoized_roles, invalidate_roles
+
+
+@receiver(m2m_changed, sender=CustomUser.groups.through)
+def group_membership_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Drop cached role answers when users are added to or removed from groups.
+    """
+    if not reverse:
+        # `instance` is the user whose groups changed
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            forget_memoized_roles(instance)
+            invalidate_roles([instance.pk])
+    elif action == 'pre_clear':
+        # The member list is gone after the clear, so collect it first
+        instance._payroll_cleared_user_ids = list(instance.customuser_set.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        invalidate_roles(instance.__dict__.pop('_payroll_cleared_user_ids', []))
+    elif action in ('post_add', 'post_remove'):
+        invalidate_roles(pk_set)
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    """
+    Renaming or deleting a group changes the roles of all of its members.
+    """
+    forget_accountant_group()
+    if instance.pk is not None:
+        invalidate_roles(list(instance.customuser_set.values_list('pk', flat=True)))
+
+
+@receiver(post_delete, sender=PayoutRequest)
+def pending_request_deleted(sender, instance, **kwargs):
+    """
+    Keep the employee's pending counters and the pending payout reports in step when a
+    pending request is deleted.
+    """
+    if instance.status == 'Pending':
+        Employee.objects.filter(pk=instance.employee_id).update(
+            pending_total=F('pending_total') - instance.amount,
+            pending_count=F('pending_count') - 1,
+        )
+        PayoutSummaryChange.removed(
+            'Pending', instance.requested_at, PayoutSummaryChange.position_of(instance.employee_id), instance.amount,
+        ).save()
@@ -1,19 +1,37 @@
+from django.conf import settings
 from django.urls import path
 from .views import *
 from django.contrib.auth.views import LogoutView
 
+if settings.PAYROLL_ASYNC_VIEWS:
+    profile_view = AsyncEmployeeProfileView
+    payout_request_list_view = AsyncPayoutRequestListView
+    payout_history_list_view = AsyncPayoutHistoryListView
+else:
+    profile_view = EmployeeProfileView
+    payout_request_list_view = PayoutRequestListView
+    payout_history_list_view = PayoutHistoryListView
+
 urlpatterns = [
     path('', HomeView.as_view(), name='home'),
-    path('profile/', EmployeeProfileView.as_view(), name='profile'),
+    path('profile/', profile_view.as_view(), name='profile'),
     path('employees/', EmployeeListView.as_view(), name='employee_list'),
     path('employees/<int:pk>/', EmployeeDetailView.as_view(), name='employee_detail'),
     path('employees/create/', EmployeeCreateView.as_view(), name='employee_create'),
-    path('payout-requests/', PayoutRequestListView.as_view(), name='payout_request_list'),
+    path('employees/import/', EmployeeImportView.as_view(), name='employee_import'),
+    path('payout-requests/', payout_request_list_view.as_view(), name='payout_request_list'),
     path('payout-request/<int:pk>/', PayoutRequestDetailView.as_view(), name='payout_request_detail'),
     path('payout-request/create/', PayoutRequestCreateView.as_view(), name='payout_request_create'),
-    path('payout-history/', PayoutHistoryListView.as_view(), name='payout_history_list'),
+    path('payout-history/', payout_history_list_view.as_view(), name='payout_history_list'),
+    path('payout-history/export/', PayoutExportView.as_view(), name='payout_export'),
+    path('reports/payouts/', PayoutReportView.as_view(), name='payout_report'),
+    path('reports/payouts.json', PayoutReportDataView.as_view(), name='payout_report_data'),
     path('register/', UserRegistrationView.as_view(), name='register'),
     path('login/', UserLoginView.as_view(), name='login'),
     path('logout/', LogoutView.as_view(next_page='/login/'), name='logout'),
     path('payout-request/<int:pk>/process/',  ProcessPayout.as_view(), name='process_payout_request'),
+    path('payout-requests/process/', ProcessPayoutBatch.as_view(), name='process_payout_batch'),
+    path('payout-jobs/<int:pk>/', PayoutJobStatusView.as_view(), name='payout_job_status'),
+    path('profiling/', ProfilingSummaryView.as_view(), name='profiling_summary'),
+    path('metrics', MetricsView.as_view(), name='metrics'),
 ]
\ No newline at end of file
@@ -1,19 +1,36 @@
-from django.shortcuts import render, redirect
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
+from django.shortcuts import get_object_or_404, render, redirect
+from django.views import View
 from django.views.generic import ListView, DetailView, CreateView, TemplateView, FormView
-from django.urls import reverse_lazy
+from django.views.generic.base import TemplateResponseMixin
+from django.urls import reverse, reverse_lazy
 from django.contrib.auth.views import LoginView
-from .models import Employee, PayoutRequest
+from .models import Employee, PayoutJob, PayoutRequest
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import Http404, HttpResponseRedirect
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.contrib.auth import login
+from django.db import IntegrityError
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib import messages
-from .forms import UserRegistrationForm, EmployeeForm, PayoutRequestForm
+from .forms import (
+    UserRegistrationForm, EmployeeForm, EmployeeImportForm, EmployeeSearchForm, PayoutRequestForm, PayoutExportForm,
+    PayoutReportForm,
+)
 from django.contrib.auth.decorators import login_required
-from .mixins import AccountantRequiredMixin
+from .mixins import AccountantRequiredMixin, AsyncAccountantRequiredMixin, AsyncLoginRequiredMixin
+from .roles import ais_accountant, is_accountant
 from .context_processors import is_accountant_or_superuser
-from django.db.models import Sum
-from django.core.exceptions import ValidationError
+from .pagination import AsyncKeysetListMixin, KeysetPaginationMixin, MultiTableKeysetPaginationMixin
+from . import archive, exports, imports, jobs, metrics, profiling, reports, routers, search
+from .payouts import create_pending
+
+def submitted_idempotency_key(request):
+    """
+    The client's idempotency key: the `Idempotency-Key` header or the form's hidden field.
+    """
+    return request.headers.get('Idempotency-Key') or request.POST.get('idempotency_key') or None
 
 class HomeView(TemplateView):
     template_name = 'payroll/home.html'
@@ -26,22 +43,84 @@ class ProcessPayout(AccountantRequiredMixin, LoginRequiredMixin, DetailView):
     def post(self, request, *args, **kwargs):
         # Retrieve the payout request object
         payout_request = self.get_object()
-
-        try:
-            payout_request.process_request()  # Calls the custom processing method on the request
-        except ValidationError as e:
-            messages.error(request, str(e))
-            return render(request, 'payroll/error.html', {'error_message': str(e)})
-
+        if payout_request.status == 'Processed':
+            error = "This payout request has already been processed."
+            messages.error(request, error)
+            return render(request, 'payroll/error.html', {'error_message': error})
+
+        # Processing happens in a payout worker; the job can be polled for the outcome
+        return job_queued_response(request, jobs.enqueue([payout_request.pk], user=request.user))
+
+def job_queued_response(request, queued):
+    """
+    202 with the status of the queued jobs for API clients, otherwise back to the pending list.
+
+    A single job is described on its own, with its status URL in `Location`.
+    """
+    if not queued:
+        messages.info(request, "No pending payout requests to process.")
         return redirect('payout_request_list')
 
+    status_urls = [reverse('payout_job_status', args=[job.pk]) for job in queued]
+    if 'application/json' in request.headers.get('Accept', ''):
+        if len(queued) == 1:
+            return JsonResponse(jobs.describe(queued[0]), status=202, headers={'Location': status_urls[0]})
+        return JsonResponse({'jobs': [jobs.describe(job) for job in queued]}, status=202)
+    if len(queued) == 1:
+        messages.success(request, f"Queued payout job #{queued[0].pk}; follow its progress at {status_urls[0]}.")
+    else:
+        messages.success(request, f"Queued payout jobs #{queued[0].pk} to #{queued[-1].pk}; "
+                                  f"follow each one's progress at its status page, starting with {status_urls[0]}.")
+    return redirect('payout_request_list')
+
+# Queue the selected (or all) pending payout requests for processing (for accountants only)
+class ProcessPayoutBatch(AccountantRequiredMixin, View):
+    def post(self, request, *args, **kwargs):
+        if request.POST.get('action') == 'all':
+            request_ids = None
+        else:
+            request_ids = [pk for pk in request.POST.getlist('request_ids') if pk.isdigit()]
+            if not request_ids:
+                messages.error(request, "No payout requests selected.")
+                return redirect('payout_request_list')
+
+        return job_queued_response(request, jobs.enqueue(request_ids, user=request.user))
+
+# Status of a queued payout job, for polling (for accountants only)
+class PayoutJobStatusView(AccountantRequiredMixin, View):
+    def get(self, request, pk, *args, **kwargs):
+        job = get_object_or_404(PayoutJob, pk=pk)
+        return JsonResponse(jobs.describe(job))
+
+# Rolling per-view profiling figures of this process (staff only, PAYROLL_PROFILING)
+class ProfilingSummaryView(View):
+    def get(self, request, *args, **kwargs):
+        if not settings.PAYROLL_PROFILING or not request.user.is_staff:
+            raise Http404
+        return JsonResponse(profiling.summary())
+
+# Prometheus scrape endpoint (PAYROLL_METRICS); served only once PAYROLL_METRICS_TOKEN is set, to bearers of it
+class MetricsView(View):
+    def get(self, request, *args, **kwargs):
+        token = settings.PAYROLL_METRICS_TOKEN
+        if not settings.PAYROLL_METRICS or not token:
+            raise Http404
+        if not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return HttpResponse(status=401)
+        return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 class UserRegistrationView(CreateView):
     form_class = UserRegistrationForm
     template_name = 'payroll/registration.html'
     success_url = reverse_lazy('profile')  # Redirects to the user profile page after successful registration
 
     def form_valid(self, form):
-        user = form.save()  # Save the new user
+        try:
+            user = form.save()  # Save the new user
+        except IntegrityError:
+            # A concurrent signup took the username or the employee since validation
+            form.add_error(None, form.registration_conflict())
+            return self.form_invalid(form)
         login(self.request, user)  # Log in the user immediately
         messages.success(self.request, "Registration successful!")
         return redirect(self.success_url)
@@ -67,40 +146,69 @@ class EmployeeCreateView(FormView):
         )
         return super().form_valid(form)
 
+# Bulk employee import from an uploaded CSV / JSONL file (for accountants only)
+class EmployeeImportView(AccountantRequiredMixin, FormView):
+    template_name = 'payroll/employee_import.html'
+    form_class = EmployeeImportForm
+    max_reported_errors = 100
+
+    def form_valid(self, form):
+        errors = []
+
+        def collect(line, row_errors):
+            # The count is always complete; only the first rows are listed
+            if len(errors) < self.max_reported_errors:
+                errors.append((line, imports.format_errors(row_errors)))
+
+        upload = form.cleaned_data['file']
+        try:
+            result = imports.import_employees(
+                imports.text_stream(upload.open('rb')), form.cleaned_data['format'],
+                dry_run=form.cleaned_data['dry_run'], on_error=collect,
+            )
+        except UnicodeDecodeError:
+            form.add_error('file', "The file must be UTF-8 encoded.")
+            return self.form_invalid(form)
+
+        return self.render_to_response(self.get_context_data(
+            form=self.form_class(), result=result, errors=errors, dry_run=form.cleaned_data['dry_run'],
+        ))
+
 # Employee profile page
 class EmployeeProfileView(LoginRequiredMixin, DetailView, FormView):
     model = Employee
+    read_replica = True  # GET requests may read from a replica (see payroll.routers)
     template_name = 'payroll/employee_profile.html'
     context_object_name = 'employee'
     form_class = PayoutRequestForm
 
     def get_object(self, queryset=None):
-        # Fetch the employee object for the logged-in user
-        self.object = self.request.user.employee
+        # Fetch the employee object for the logged-in user (once per request)
+        if getattr(self, 'object', None) is None:
+            try:
+                self.object = Employee.objects.with_balance().get(pk=self.request.user.employee_id)
+            except Employee.DoesNotExist:
+                raise Http404("You do not have an associated employee record.")
         return self.object
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         employee = self.get_object()
-        context['total_pending_amount'] = (
-            PayoutRequest.objects.filter(employee=employee, status='Pending')
-            .aggregate(total_amount=Sum('amount'))['total_amount'] or 0
-        )
+        context['total_pending_amount'] = employee.pending_total  # Maintained counter, no aggregate
         context['form'] = self.get_form()  # Include the form in the context
         return context
 
     def form_valid(self, form):
         employee = self.get_object()
-        amount = form.cleaned_data['amount']
-        if amount > employee.available_earnings:
-            form.add_error('amount', 'Requested amount exceeds available earnings.')
+        try:
+            # A resubmitted form (same key) gets the same redirect without a second request
+            create_pending(
+                employee, form.cleaned_data['amount'],
+                user=self.request.user, idempotency_key=submitted_idempotency_key(self.request),
+            )
+        except ValueError as e:
+            form.add_error('amount', str(e))
             return self.form_invalid(form)
-
-        PayoutRequest.objects.create(
-            employee=employee,
-            amount=amount,
-            status='Pending'
-        )
         return HttpResponseRedirect(reverse_lazy('profile'))
 
     def form_invalid(self, form):
@@ -110,23 +218,36 @@ class EmployeeProfileView(LoginRequiredMixin, DetailView, FormView):
         return self.render_to_response(context)
 
 # Page to view all employees (for accountants only)
-class EmployeeListView(AccountantRequiredMixin, ListView):
+class EmployeeListView(AccountantRequiredMixin, KeysetPaginationMixin, ListView):
     model = Employee
+    read_replica = True
     template_name = 'payroll/employee_list.html'
     context_object_name = 'employees'
 
     def get_queryset(self):
-        return Employee.objects.all().order_by('-salary_rate')
+        self.search_form = EmployeeSearchForm(self.request.GET or None)
+        queryset = Employee.objects.all()
+        if self.search_form.is_valid():
+            queryset = search.filter_employees(queryset, **self.search_form.cleaned_data)
+        return queryset.order_by('-salary_rate')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['search_form'] = self.search_form
+        return context
 
 # Employee details page (for accountants only)
 class EmployeeDetailView(AccountantRequiredMixin, DetailView):
     model = Employee
+    read_replica = True
+    queryset = Employee.objects.with_balance()
     template_name = 'payroll/employee_detail.html'
     context_object_name = 'employee'
 
 # Page to view all payout requests (for accountants only)
-class PayoutRequestListView(AccountantRequiredMixin, ListView):
+class PayoutRequestListView(AccountantRequiredMixin, KeysetPaginationMixin, ListView):
     model = PayoutRequest
+    read_replica = True
     template_name = 'payroll/payout_request_list.html'
     context_object_name = 'payout_requests'
 
@@ -139,7 +260,7 @@ class PayoutRequestListView(AccountantRequiredMixin, ListView):
         sort_by = self.request.GET.get('sort_by', 'requested_at')  # Default sorting field
         order = self.request.GET.get('order', 'asc')  # Default sorting order
 
-        queryset = PayoutRequest.objects.filter(status="Pending")
+        queryset = PayoutRequest.objects.filter(status="Pending").select_related('employee')
 
         if sort_by == 'amount':
             if order == 'asc':
@@ -161,39 +282,46 @@ class PayoutRequestCreateView(LoginRequiredMixin, CreateView):
     success_url = reverse_lazy('profile')
 
     def form_valid(self, form):
-        employee = self.request.user.employee
-        requested_amount = form.cleaned_data['amount']
-        if requested_amount > employee.available_earnings:
-            messages.error(self.request, f"Requested amount exceeds available earnings (${employee.available_earnings:.2f}).")
+        try:
+            self.object, _ = create_pending(
+                self.request.user.employee, form.cleaned_data['amount'],
+                user=self.request.user, idempotency_key=submitted_idempotency_key(self.request),
+            )
+        except ValueError as e:
+            messages.error(self.request, str(e))
             return self.form_invalid(form)
-        form.instance.employee = self.request.user.employee
-        return super().form_valid(form)
+        return HttpResponseRedirect(self.get_success_url())
 
 # Payout request detail view
 class PayoutRequestDetailView(AccountantRequiredMixin, DetailView):
     model = PayoutRequest
+    read_replica = True
+    queryset = PayoutRequest.objects.select_related('employee')
     template_name = 'payroll/payout_request_detail.html'
     context_object_name = 'payout_request'
 
-# View for payout history
-class PayoutHistoryListView(LoginRequiredMixin, ListView):
+# View for payout history, across live and archived payout requests
+class PayoutHistoryListView(LoginRequiredMixin, MultiTableKeysetPaginationMixin, ListView):
     model = PayoutRequest
+    read_replica = True
     template_name = 'payroll/payout_history_list.html'
     context_object_name = 'payout_history'
 
-    def get_queryset(self):
+    def get_histories(self):
         user = self.request.user
+        if is_accountant(user):
+            live, archived = archive.history()
+        elif user.employee_id is not None:
+            live, archived = archive.history(employee_id=user.employee_id)
+        else:
+            raise Http404("You do not have an associated employee record.")
+        return [self.sort(queryset.select_related('employee')) for queryset in (live, archived)]
+
+    def sort(self, queryset):
         order = self.request.GET.get('order', 'asc')
 
         sort_by = self.request.GET.get('sort_by', 'requested_at')
 
-        if user.groups.filter(name='Accountant').exists():
-            queryset = PayoutRequest.objects.filter(status="Processed")
-        elif hasattr(user, 'employee'):
-            queryset = PayoutRequest.objects.filter(employee=user.employee, status='Processed')
-        else:
-            raise Http404("You do not have an associated employee record.")
-
         if sort_by == 'amount':
             if order == 'asc':
                 queryset = queryset.order_by('amount')
@@ -206,3 +334,105 @@ class PayoutHistoryListView(LoginRequiredMixin, ListView):
                 queryset = queryset.order_by('-requested_at')
 
         return queryset
+
+    def get_queryset(self):
+        return self.get_histories()[0]
+
+    def get_other_querysets(self):
+        return self.get_histories()[1:]
+
+# Streaming export of processed payouts (for accountants only)
+class PayoutExportView(AccountantRequiredMixin, View):
+    read_replica = True
+    chunk_size = 2000
+
+    def get(self, request, *args, **kwargs):
+        form = PayoutExportForm(request.GET)
+        if not form.is_valid():
+            return HttpResponseBadRequest(form.errors.as_text())
+
+        export_format = form.cleaned_data['format']
+        querysets = exports.processed_payouts(
+            start=form.cleaned_data['start'],
+            end=form.cleaned_data['end'],
+            employee_id=form.cleaned_data['employee'],
+        )
+        # Streamed after the view returns, so the replica is picked now
+        response = StreamingHttpResponse(
+            exports.export_lines(
+                [routers.bind(queryset) for queryset in querysets], export_format, chunk_size=self.chunk_size,
+            ),
+            content_type=exports.FORMATS[export_format],
+        )
+        response['Content-Disposition'] = f'attachment; filename="payouts.{export_format}"'
+        return response
+
+# Payout report by month and position, read from the precomputed summary (for accountants only)
+class PayoutReportView(AccountantRequiredMixin, TemplateView):
+    read_replica = True
+    template_name = 'payroll/payout_report.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        form = PayoutReportForm(self.request.GET or None)
+        filters = form.cleaned_data if form.is_valid() else {}
+        context.update(form=form, **reports.report(**filters))
+        return context
+
+# The same report as JSON (for accountants only)
+class PayoutReportDataView(AccountantRequiredMixin, View):
+    read_replica = True
+
+    def get(self, request, *args, **kwargs):
+        form = PayoutReportForm(request.GET)
+        if not form.is_valid():
+            return HttpResponseBadRequest(form.errors.as_text())
+        return JsonResponse(reports.as_json(reports.report(**form.cleaned_data)))
+
+# Async versions of the read-heavy pages, served instead of the sync ones when
+# PAYROLL_ASYNC_VIEWS is on (see urls.py). They only pay off under an ASGI server.
+
+class AsyncEmployeeProfileView(AsyncLoginRequiredMixin, TemplateResponseMixin, View):
+    read_replica = True
+    template_name = 'payroll/employee_profile.html'
+
+    async def get_employee(self):
+        try:
+            return await Employee.objects.with_balance().aget(pk=self.request.user.employee_id)
+        except Employee.DoesNotExist:
+            raise Http404("You do not have an associated employee record.")
+
+    def render_profile(self, employee, form):
+        return self.render_to_response({
+            'employee': employee,
+            'total_pending_amount': employee.pending_total,  # Maintained counter, no aggregate
+            'form': form,
+            'view': self,
+        })
+
+    async def get(self, request, *args, **kwargs):
+        return self.render_profile(await self.get_employee(), PayoutRequestForm())
+
+    async def post(self, request, *args, **kwargs):
+        employee = await self.get_employee()
+        form = PayoutRequestForm(request.POST)
+        if form.is_valid():
+            try:
+                await sync_to_async(create_pending)(
+                    employee, form.cleaned_data['amount'],
+                    user=request.user, idempotency_key=submitted_idempotency_key(request),
+                )
+            except ValueError as e:
+                form.add_error('amount', str(e))
+            else:
+                return HttpResponseRedirect(reverse_lazy('profile'))
+        return self.render_profile(employee, form)
+
+class AsyncPayoutRequestListView(AsyncAccountantRequiredMixin, AsyncKeysetListMixin, PayoutRequestListView):
+    pass
+
+class AsyncPayoutHistoryListView(AsyncLoginRequiredMixin, AsyncKeysetListMixin, PayoutHistoryListView):
+    async def aget_queryset(self):
+        # Memoizes the role on the user, so the sync get_queryset() does not query for it
+        await ais_accountant(self.request.user)
+        return self.get_queryset()
@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 from pathlib import Path
 from decouple import config
 
+from . import db
+
 
 
 SECRET_KEY = config('DJANGO_SECRET_KEY')
@@ -44,6 +46,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Does nothing unless PAYROLL_PROFILING is set; first, so it measures the other middleware too
+    'payroll.profiling.ProfilingMiddleware',
+    # Per-view request latency for /metrics (PAYROLL_METRICS)
+    'payroll.metrics.MetricsMiddleware',
+    # Outside the session middleware, so session writes also pin the client to the primary
+    'payroll.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -80,14 +88,47 @@ WSGI_APPLICATION = 'payroll_system.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
-}
+# The primary database (DATABASE_URL, this SQLite file by default) and the read replicas
+# (PAYROLL_READ_REPLICAS, comma-separated), tuned from the environment; see payroll_system/db.py.
+# Views marked `read_replica = True` read from the replicas (see payroll.routers); a client
+# that just wrote keeps reading from the primary for PAYROLL_REPLICA_PIN_SECONDS.
+DATABASES = db.databases(default_url=str(BASE_DIR / 'db.sqlite3'))
+SQLITE_PRAGMAS = db.sqlite_pragmas()
+PAYROLL_REPLICA_DATABASES = [alias for alias in DATABASES if alias != 'default']
+PAYROLL_REPLICA_PIN_SECONDS = config('PAYROLL_REPLICA_PIN_SECONDS', default=5, cast=int)
+DATABASE_ROUTERS = ['payroll.routers.ReplicaRouter']
 
 AUTH_USER_MODEL = 'payroll.CustomUser'
+
+# Seconds to cache "is this user an accountant" answers across requests (0 disables).
+# Only enable with a cache shared by all workers (Redis, Memcached) so that membership
+# changes invalidate the entry everywhere.
+PAYROLL_ROLE_CACHE_TIMEOUT = config('PAYROLL_ROLE_CACHE_TIMEOUT', default=0, cast=int)
+# Serve the profile, payout request and payout history pages with async views.
+# Enable when running under an ASGI server (uvicorn payroll_system.asgi:application).
+PAYROLL_ASYNC_VIEWS = config('PAYROLL_ASYNC_VIEWS', default=False, cast=bool)
+# Seconds a payout submission's idempotency key is remembered (see `purge_idempotency_keys`).
+PAYROLL_IDEMPOTENCY_KEY_TTL = config('PAYROLL_IDEMPOTENCY_KEY_TTL', default=24 * 60 * 60, cast=int)
+# Processed payout requests older than this many days are moved to the archive table
+# by `manage.py archive_payouts` (see payroll.archive).
+PAYROLL_ARCHIVE_AFTER_DAYS = config('PAYROLL_ARCHIVE_AFTER_DAYS', default=90, cast=int)
+# Class that hands out employee codes (see payroll.codes).
+PAYROLL_EMPLOYEE_CODE_GENERATOR = config('PAYROLL_EMPLOYEE_CODE_GENERATOR', default='payroll.codes.SequenceCodeGenerator')
+# Per-request profiling (see payroll.profiling): Server-Timing headers and a rolling
+# per-view summary at /profiling/ for staff. A share of requests (0.0-1.0) can also be
+# run under cProfile, with the .prof files written to PAYROLL_PROFILING_DIR.
+PAYROLL_PROFILING = config('PAYROLL_PROFILING', default=False, cast=bool)
+PAYROLL_PROFILING_WINDOW = config('PAYROLL_PROFILING_WINDOW', default=500, cast=int)
+PAYROLL_PROFILING_SAMPLE_RATE = config('PAYROLL_PROFILING_SAMPLE_RATE', default=0.0, cast=float)
+PAYROLL_PROFILING_DIR = config('PAYROLL_PROFILING_DIR', default=str(BASE_DIR / 'profiles'))
+# Prometheus-style metrics at /metrics (see payroll.metrics). With several worker processes
+# set PAYROLL_METRICS_DIR to a directory shared by them (emptied on deploy) so a scrape
+# sees all of them. The endpoint is only served once PAYROLL_METRICS_TOKEN is set, and
+# scrapes must send that token as a bearer token.
+PAYROLL_METRICS = config('PAYROLL_METRICS', default=True, cast=bool)
+PAYROLL_METRICS_DIR = config('PAYROLL_METRICS_DIR', default='')
+PAYROLL_METRICS_FLUSH_INTERVAL = config('PAYROLL_METRICS_FLUSH_INTERVAL', default=1.0, cast=float)
+PAYROLL_METRICS_TOKEN = config('PAYROLL_METRICS_TOKEN', default='')
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 